@@ -0,0 +1,315 @@
+"""Replays synthetic OpenDota payloads through the report generators and the monitor.
+
+Run from the repository root, for example:
+    python benchmarks/bench_reports.py --players 10 50 --matches 100 2000 20000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vintage_stats import data_processing  # noqa: E402
+from vintage_stats.cache import CacheHandler, PayloadCache, RateLimiter  # noqa: E402
+from vintage_stats.data_processing import get_mmr_history_table  # noqa: E402
+from vintage_stats.heroes import HeroRegistry  # noqa: E402
+from vintage_stats.history_store import MatchHistoryStore  # noqa: E402
+from vintage_stats.match_store import MatchStore  # noqa: E402
+from vintage_stats.metrics import RequestMetrics  # noqa: E402
+from vintage_stats.monitor import run_monitor_cycle  # noqa: E402
+from vintage_stats.player import PlayerPool  # noqa: E402
+from vintage_stats.reports import generate_winrate_report, get_all_stacks_report  # noqa: E402
+from vintage_stats.serialization import STATE_SUFFIX  # noqa: E402
+
+FIRST_PLAYER_ID = 1000
+FRIEND_GROUP_SIZE = 5
+
+
+class FakeResponse:
+    def __init__(self, url, status_code, payload):
+        self.url = url
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode("utf-8")
+        self.headers = {"Content-Type": "application/json"}
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start : start + chunk_size]
+
+    def close(self):
+        pass
+
+    def __bool__(self):
+        return self.ok
+
+
+class FakeOpenDotaSession:
+    """Stands in for requests.Session, serves synthetic matches for a pool of players.
+    Players are split into friend groups, party games are shared by random members of one group."""
+
+    def __init__(self, player_count, match_count, seed=0):
+        self.request_count = 0
+        self.player_matches = {}
+        randomizer = random.Random(seed)
+        now = int(time.time())
+        player_ids = [FIRST_PLAYER_ID + index for index in range(player_count)]
+        for player_id in player_ids:
+            self.player_matches[player_id] = []
+
+        # Every player averages match_count games, spread over two years
+        game_count = player_count * match_count
+        for game_index in range(game_count):
+            match_id = 8_000_000_000 - game_index
+            start_time = now - game_index * (2 * 365 * 86400 // game_count) - 600
+            player_id = randomizer.choice(player_ids)
+            group_start = (player_id - FIRST_PLAYER_ID) // FRIEND_GROUP_SIZE
+            group = player_ids[
+                group_start * FRIEND_GROUP_SIZE : (group_start + 1) * FRIEND_GROUP_SIZE
+            ]
+            party = [player_id]
+            # The last group can be a single player, who only plays solo
+            if len(group) > 1 and randomizer.random() < 0.3:
+                party = randomizer.sample(group, randomizer.randint(2, len(group)))
+            radiant_win = randomizer.random() < 0.5
+            on_dire = randomizer.random() < 0.5
+            for slot, party_member_id in enumerate(party):
+                self.player_matches[party_member_id].append(
+                    {
+                        "match_id": match_id,
+                        "player_slot": slot + (128 if on_dire else 0),
+                        "radiant_win": radiant_win,
+                        "duration": randomizer.randint(1200, 3600),
+                        "game_mode": 22,
+                        "lobby_type": 7,
+                        "hero_id": randomizer.randint(1, 125),
+                        "start_time": start_time,
+                        "version": 21 if randomizer.random() < 0.5 else None,
+                        "kills": randomizer.randint(0, 20),
+                        "deaths": randomizer.randint(0, 15),
+                        "assists": randomizer.randint(0, 30),
+                        "skill": None,
+                        "average_rank": 55,
+                        "leaver_status": 0,
+                        "party_size": len(party) if len(party) > 1 else 1,
+                    }
+                )
+
+    def get(self, url, **kwargs):
+        self.request_count += 1
+        path, _, query = url.partition("?")
+        parameters = dict(
+            parameter.split("=", 1) for parameter in query.split("&") if parameter
+        )
+
+        player_match = re.search(r"/players/(\d+)/(matches|recentMatches)$", path)
+        if player_match:
+            matches = self.player_matches.get(int(player_match.group(1)), [])
+            if player_match.group(2) == "recentMatches":
+                return FakeResponse(url, 200, matches[:20])
+            if "date" in parameters:
+                oldest_start_time = time.time() - int(parameters["date"]) * 86400
+                matches = [
+                    match
+                    for match in matches
+                    if match["start_time"] > oldest_start_time
+                ]
+            if "lobby_type" in parameters:
+                matches = [
+                    match
+                    for match in matches
+                    if match["lobby_type"] == int(parameters["lobby_type"])
+                ]
+            if "limit" in parameters:
+                matches = matches[: int(parameters["limit"])]
+            return FakeResponse(url, 200, matches)
+
+        profile_match = re.search(r"/players/(\d+)$", path)
+        if profile_match:
+            return FakeResponse(
+                url,
+                200,
+                {"profile": {"personaname": f"player{profile_match.group(1)}"}},
+            )
+        if path.endswith("/heroes"):
+            return FakeResponse(
+                url,
+                200,
+                [
+                    {"id": hero_id, "localized_name": f"Hero {hero_id}"}
+                    for hero_id in range(1, 126)
+                ],
+            )
+        return FakeResponse(url, 404, {"error": "Not Found"})
+
+    def post(self, url, *args, **kwargs):
+        self.request_count += 1
+        return FakeResponse(url, 200, {"job": {"jobId": self.request_count}})
+
+    def close(self):
+        pass
+
+
+def reset_state(session):
+    CacheHandler.session = session
+    CacheHandler.response_cache = PayloadCache()
+    # Aggregates only, the per-request log would add file writes to every measurement
+    CacheHandler.metrics = RequestMetrics(log_path=None)
+    CacheHandler.requests_count = 0
+    CacheHandler.persistent_cache = None
+    CacheHandler.rate_limiter = RateLimiter(requests_per_minute=10**9, burst=10**9)
+    MatchStore.clear()
+    MatchStore.requested_days = 0
+    session.request_count = 0
+
+
+def measure(name, function, session, player_count, match_count, results, warm=False):
+    """Times one run, then repeats it under tracemalloc for the allocation peak.
+    Warm runs keep the state left by the previous call, cold runs start from a reset transport."""
+    if not warm:
+        reset_state(session)
+    session.request_count = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    elapsed = time.perf_counter() - start
+    request_count = session.request_count
+
+    if not warm:
+        reset_state(session)
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results.append(
+        {
+            "report": name,
+            "players": player_count,
+            "matches": match_count,
+            "seconds": round(elapsed, 4),
+            "peak_kib": peak // 1024,
+            "requests": request_count,
+        }
+    )
+    print(
+        f"{name:<24}{player_count:>8}{match_count:>9}{elapsed:>10.3f}"
+        f"{peak // 1024:>12}{request_count:>10}",
+        flush=True,
+    )
+
+
+def run_benchmarks(player_count, match_count, results):
+    session = FakeOpenDotaSession(player_count, match_count)
+    pool = PlayerPool(
+        [
+            {"pid": FIRST_PLAYER_ID + index, "nick": f"Player{index:03d}"}
+            for index in range(player_count)
+        ]
+    )
+    date_from = datetime.now() - timedelta(days=2 * 365)
+
+    measure(
+        "winrate_report",
+        lambda: generate_winrate_report(pool, 3, date_from, datetime.now()),
+        session,
+        player_count,
+        match_count,
+        results,
+    )
+
+    for stack_size in (2, 3):
+        measure(
+            f"stacks_report_{stack_size}",
+            lambda: get_all_stacks_report(pool, stack_size, True, date_from),
+            session,
+            player_count,
+            match_count,
+            results,
+        )
+
+    player = pool.get_player_list()[0]
+    player_matches = session.player_matches[player.player_id]
+    known_match_id = player_matches[len(player_matches) // 2]["match_id"]
+    measure(
+        "mmr_history_table",
+        lambda: get_mmr_history_table(player, known_match_id, 4000),
+        session,
+        player_count,
+        match_count,
+        results,
+    )
+
+    # Every grid point starts with an empty history store, without the change probe
+    # the state it keeps in the shared work dir would skip the players of later points
+    history_dir = tempfile.mkdtemp(prefix="histories_", dir=os.getcwd())
+    data_processing.match_history_store = MatchHistoryStore(
+        Path(history_dir, "history.sqlite")
+    )
+    reset_state(session)
+    measure(
+        "monitor_cycle",
+        lambda: run_monitor_cycle(pool, use_probe=False),
+        session,
+        player_count,
+        match_count,
+        results,
+        warm=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", nargs="+", type=int, default=[10, 50])
+    parser.add_argument("--matches", nargs="+", type=int, default=[100, 2000])
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    benchmark_args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = []
+    output_path = (
+        Path(benchmark_args.output).resolve() if benchmark_args.output else None
+    )
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Local state files (histories, snapshots) are written relative to the working directory
+        os.chdir(work_dir)
+        HeroRegistry.snapshot_path = Path(work_dir, f"heroes{STATE_SUFFIX}")
+        print(
+            f"{'REPORT':<24}{'PLAYERS':>8}{'MATCHES':>9}{'SECONDS':>10}"
+            f"{'PEAK KIB':>12}{'REQUESTS':>10}"
+        )
+        for player_count in benchmark_args.players:
+            for match_count in benchmark_args.matches:
+                run_benchmarks(player_count, match_count, results)
+        os.chdir(os.path.dirname(work_dir))
+
+    if output_path:
+        with output_path.open(mode="w") as output_file:
+            json.dump(results, output_file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
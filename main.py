@@ -1,13 +1,7 @@
 import argparse
 import logging
-
-from tabulate import tabulate
 from datetime import datetime, timedelta
 
-
-import timeago
-
-import vintage_stats.player
 from vintage_stats.constants import (
     FAZY_ID,
     KESKOO_ID,
@@ -16,24 +10,7 @@ from vintage_stats.constants import (
     WARELIC_ID,
     GAME_MODES,
 )
-from vintage_stats.data_processing import (
-    get_last_matches_map,
-    log_requests_count,
-    format_and_print_winrate_report,
-    request_match_parse,
-    get_player_match_history,
-    CacheHandler,
-    handle_recent_matches_file,
-    update_player_match_history,
-    get_match_history_difference,
-)
-from vintage_stats.reports import (
-    generate_winrate_report,
-    get_all_stacks_report,
-    get_player_activity_report,
-    generate_last_week_report,
-)
-from vintage_stats.utility import get_last_monday
+from vintage_stats.utility import get_days_since_date, get_last_monday
 
 # region args
 parser = argparse.ArgumentParser(
@@ -43,8 +20,34 @@ parser = argparse.ArgumentParser(
 
 parser.add_argument("-m", "--monitor", action="store_true")
 
+parser.add_argument(
+    "-d",
+    "--daemon",
+    help="Keep monitoring in a resident process, polling each player on an adaptive schedule",
+    action="store_true",
+)
+
+parser.add_argument(
+    "--metrics-port",
+    help="In daemon mode, serve request metrics in Prometheus text format on this local port",
+    type=int,
+)
+
 parser.add_argument("-w", "--simple_last_week", action="store_true")
 
+parser.add_argument(
+    "--workers",
+    help="How many players to fetch from OpenDota concurrently. Default is 4.",
+    default="4",
+    type=int,
+)
+parser.add_argument(
+    "--processes",
+    help="Split the report pass over players into this many processes. Default is 0, no extra processes.",
+    default="0",
+    type=int,
+)
+
 # region unused
 parser.add_argument(
     "--HCT",
@@ -74,6 +77,11 @@ parser.add_argument(
     help="Print games per week in last 6 months or more",
     action="store_true",
 )
+parser.add_argument(
+    "--match-details",
+    help="Fetch details of every match in the --date-from/--date-to range into the match detail store",
+    action="store_true",
+)
 parser.add_argument("-monitor", "--monitor_old", help="")
 parser.add_argument(
     "-monrep",
@@ -108,78 +116,113 @@ vintage_player_map = [
     {"pid": WARELIC_ID, "nick": "Warelic"},
 ]
 
-vintage = vintage_stats.player.PlayerPool(vintage_player_map)
 logging.basicConfig()
 logging.getLogger().setLevel(logging.INFO)
 
 
-def main():
-    if args.monitor:
-        match_id_to_match_listing = {}
-        for player in vintage:
-            # region get recent matches
-            logging.info(
-                f"\n-----------------------------------------------------------------------\n"
-                f"Getting recentMatches for player"
-                f" {player.nick} from API."
-            )
-            response_str = (
-                f"https://api.opendota.com/api/players/{player.player_id}/recentMatches"
-            )
-            try:
-                recent_matches = CacheHandler.opendota_request_get(response_str).json()
-            except Exception as e:
-                logging.error(
-                    f"Could not get recentMatches for player {player.nick}, skipping in this cycle, error: {e}."
-                )
-                continue
+def get_custom_date_range():
+    date_from = datetime.now() - timedelta(days=28)
+    date_to = datetime.now()
+    if args.date_to != "now":
+        date_to = datetime.fromisoformat(args.date_to)
+    if args.date_from != "28d":
+        date_from = datetime.fromisoformat(args.date_from)
+    return date_from, date_to
 
-            if not recent_matches:
-                logging.error(
-                    f"Could not get recentMatches for player {player.nick}, skipping in this cycle, recent_matches empty."
-                )
-                continue
 
-            handle_recent_matches_file(recent_matches, player)
-            logging.info(
-                f"Finished getting recentMatches, length: {len(recent_matches)} for player {player.nick}."
-            )
-            # endregion
+def request_report_windows():
+    """Announces the widest match window up front, so each player's matches are fetched only once"""
+    from vintage_stats.match_store import MatchStore
 
-            logging.info(f"Getting matchHistory for player {player.nick}.")
-            match_history = get_player_match_history(player)
-            logging.debug(len(match_history))
-            logging.debug(match_history)
+    if args.simple_last_week:
+        MatchStore.request_window(7)
+    if args.since_monday_report:
+        MatchStore.request_window(get_days_since_date(get_last_monday()))
+    if args.custom_report or args.stack_reports or args.match_details:
+        MatchStore.request_window(get_days_since_date(get_custom_date_range()[0]))
+    if args.activity_report:
+        MatchStore.request_window(
+            get_days_since_date(datetime.fromisoformat("2019-01-03"))
+        )
 
-            if len(match_history) == 0:
-                logging.info(f"Match history empty for player {player.nick}, skipping.")
-                continue
-            logging.info(
-                f"Finished getting matchHistory for player {player.nick}, length: {len(match_history)}."
-            )
 
-            match_id_to_match_listing, common_history_point = (
-                get_match_history_difference(
-                    player, recent_matches, match_history, match_id_to_match_listing
-                )
-            )
+def main():
+    # Imported here, so that --help and argument errors return without loading requests and the OpenDota layer
+    import vintage_stats.player
+    from vintage_stats.data_processing import (
+        get_last_matches_map,
+        log_requests_count,
+        format_and_print_winrate_report,
+        request_match_parse,
+        flush_parse_requests,
+        CacheHandler,
+    )
+    from vintage_stats.monitor import MonitorDaemon, run_monitor_cycle
+    from vintage_stats.pipeline import (
+        LastWeekReportConsumer,
+        ReportPipeline,
+        StacksReportConsumer,
+        WinrateReportConsumer,
+    )
+    from vintage_stats.reports import get_player_activity_report
+
+    # Player profiles are loaded only when a report needs them
+    vintage = vintage_stats.player.PlayerPool(vintage_player_map)
+
+    CacheHandler.max_workers = args.workers
+    request_report_windows()
 
-            update_player_match_history(
-                player, recent_matches, match_history, common_history_point
-            )
+    if args.monitor:
+        run_monitor_cycle(vintage)
+        logging.info("Monitor run finished.")
 
-        for match_listing in match_id_to_match_listing.values():
-            players_involved = [player.nick for player in match_listing.players]
-            logging.info(
-                f"\n\n{match_listing.get_common_data()['match_id']}: {match_listing.is_vintage_party}, "
-                f"players: {players_involved}"
-            )
-            match_listing.print_listing()
+    if args.daemon:
+        if args.metrics_port is not None:
+            from vintage_stats.metrics import MetricsServer
 
-        logging.info("Monitor run finished.")
+            MetricsServer(
+                lambda: CacheHandler.metrics.render_prometheus(
+                    CacheHandler.rate_limiter
+                ),
+                args.metrics_port,
+            ).start()
+        MonitorDaemon(vintage).run()
 
+    # Every requested report is computed from one pass over each player's matches
+    pipeline = ReportPipeline(vintage)
     if args.simple_last_week:
-        last_week_simple_report = generate_last_week_report(vintage)
+        last_week_consumer = pipeline.register(LastWeekReportConsumer())
+    if args.since_monday_report:
+        since_monday_consumer = pipeline.register(
+            WinrateReportConsumer(
+                hero_count_threshold=2,
+                _cutoff_date_from=get_last_monday(),
+                _cutoff_date_to=datetime.now(),
+            )
+        )
+    if args.custom_report:
+        date_from, date_to = get_custom_date_range()
+        custom_consumer = pipeline.register(
+            WinrateReportConsumer(
+                hero_count_threshold=args.HT,
+                _cutoff_date_from=date_from,
+                _cutoff_date_to=date_to,
+            )
+        )
+    if args.stack_reports:
+        date_from, date_to = get_custom_date_range()
+        stacks_consumer = pipeline.register(
+            StacksReportConsumer(
+                player_counts=(2, 3),
+                exclusive=True,
+                _cutoff_date_from=date_from,
+                _cutoff_date_to=date_to,
+            )
+        )
+    reports = pipeline.run(args.processes)
+
+    if args.simple_last_week:
+        last_week_simple_report = reports[last_week_consumer]
         for player in last_week_simple_report:
             if player["total"].get_count() == 0:
                 continue
@@ -190,6 +233,8 @@ def main():
 
     # region archived
     if args.monitor_old:
+        import timeago
+
         post_only_new = True
         if args.monitor_old == "all":
             post_only_new = False
@@ -207,6 +252,7 @@ def main():
 
         for match_id in set_for_parse:
             request_match_parse(match_id)
+        flush_parse_requests()
 
         for player in last_matches_map:
             match = last_matches_map[player]
@@ -235,16 +281,9 @@ def main():
             )
 
     if args.since_monday_report:
-        hero_count_threshold = 2
+        hero_count_threshold = since_monday_consumer.hero_count_threshold
         best_heroes_threshold = 1
-        date_from = get_last_monday()
-        date_to = datetime.now()
-        last_week_winrate_report = generate_winrate_report(
-            vintage,
-            hero_count_threshold=hero_count_threshold,
-            _cutoff_date_from=date_from,
-            _cutoff_date_to=date_to,
-        )
+        last_week_winrate_report = reports[since_monday_consumer]
 
         format_and_print_winrate_report(
             last_week_winrate_report, hero_count_threshold, best_heroes_threshold
@@ -261,19 +300,9 @@ def main():
         print(
             f"played_heroes_threshold:{player_heroes_threshold}, best_worst_heroes_count: {best_worst_heroes_count}, games_for_hero_report: {games_for_hero_report}"
         )
-        date_from = datetime.now() - timedelta(days=28)
-        date_to = datetime.now()
-        if args.date_to != "now":
-            date_to = datetime.fromisoformat(args.date_to)
-        if args.date_from != "28d":
-            date_from = datetime.fromisoformat(args.date_from)
-
-        last_week_winrate_report = generate_winrate_report(
-            vintage,
-            hero_count_threshold=player_heroes_threshold,
-            _cutoff_date_from=date_from,
-            _cutoff_date_to=date_to,
-        )
+        date_from = custom_consumer.cutoff_date_from
+        date_to = custom_consumer.cutoff_date_to
+        last_week_winrate_report = reports[custom_consumer]
 
         print(
             "Printing Vintage winrate report for time period from {} to {}, hero threshold set to {}.".format(
@@ -291,27 +320,10 @@ def main():
         )
 
     if args.stack_reports:
-        date_from = datetime.now() - timedelta(days=28)
-        date_to = datetime.now()
-        if args.date_to != "now":
-            date_to = datetime.fromisoformat(args.date_to)
-        if args.date_from != "28d":
-            date_from = datetime.fromisoformat(args.date_from)
-
-        all_duo_stacks_report = get_all_stacks_report(
-            vintage,
-            2,
-            exclusive=True,
-            _cutoff_date_from=date_from,
-            _cutoff_date_to=date_to,
-        )
-        all_triple_stacks_report = get_all_stacks_report(
-            vintage,
-            3,
-            exclusive=True,
-            _cutoff_date_from=date_from,
-            _cutoff_date_to=date_to,
-        )
+        all_duo_stacks_report = reports[stacks_consumer][2]
+        all_triple_stacks_report = reports[stacks_consumer][3]
+
+        from tabulate import tabulate
 
         rows = []
         for stack in all_duo_stacks_report + all_triple_stacks_report:
@@ -336,6 +348,13 @@ def main():
             )
         )
 
+    if args.match_details:
+        from vintage_stats.data_processing import match_detail_store
+
+        date_from, date_to = get_custom_date_range()
+        fetched_count = match_detail_store.prefetch_players(vintage, date_from, date_to)
+        logging.info(f"Fetched details of {fetched_count} new matches.")
+
     if args.activity_report:
         date_from = datetime.fromisoformat("2019-01-03")
         date_to = datetime.now()
@@ -345,4 +364,10 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    from vintage_stats.cache import OpenDotaError
+
+    try:
+        main()
+    except OpenDotaError as e:
+        logging.error(f"OpenDota is unavailable, no report was printed: {e}")
+        raise SystemExit(1)
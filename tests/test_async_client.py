@@ -0,0 +1,308 @@
+import asyncio
+import json
+import re
+import threading
+import time
+import unittest
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+import requests.adapters
+
+from vintage_stats.async_client import AsyncOpenDotaClient
+from vintage_stats.cache import CacheHandler, CircuitBreaker, PayloadCache, RateLimiter
+from vintage_stats.match_store import MatchStore
+from vintage_stats.metrics import RequestMetrics
+from vintage_stats.reports import (
+    generate_last_week_report,
+    generate_last_week_report_async,
+    generate_winrate_report,
+    generate_winrate_report_async,
+    get_all_stacks_report,
+    get_all_stacks_report_async,
+)
+from vintage_stats.utility import WLRecord
+
+OPENDOTA_URL = "https://api.opendota.com"
+PLAYER_IDS = (1, 2, 3, 4)
+GAME_COUNT = 60
+# Every request to the stub server takes at least this long, so concurrent ones overlap
+REQUEST_DELAY = 0.05
+
+
+def get_player_matches(now):
+    """Deterministic match lists of PLAYER_IDS over the last week, every third game is a party"""
+    player_matches = {player_id: [] for player_id in PLAYER_IDS}
+    for game_index in range(GAME_COUNT):
+        first_player_id = PLAYER_IDS[game_index % len(PLAYER_IDS)]
+        party = [first_player_id]
+        if game_index % 3 == 0:
+            party.append(PLAYER_IDS[(game_index + 1) % len(PLAYER_IDS)])
+        for slot, player_id in enumerate(party):
+            player_matches[player_id].append(
+                {
+                    "match_id": 7_000_000_000 - game_index,
+                    "start_time": now - game_index * 2 * 3600 - 600,
+                    "hero_id": 1 + game_index % 5,
+                    "player_slot": slot,
+                    "radiant_win": game_index % 2 == 0 or game_index % 7 == 0,
+                    "party_size": len(party),
+                    "lobby_type": 0 if game_index % 10 == 9 else 7,
+                    "kills": game_index % 11,
+                    "deaths": game_index % 7,
+                    "assists": game_index % 13,
+                    "duration": 1800 + game_index,
+                    "game_mode": 22,
+                    "version": None,
+                }
+            )
+    return player_matches
+
+
+class StubOpenDotaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            parts = urlsplit(self.path)
+            parameters = dict(parse_qsl(parts.query))
+            delay = REQUEST_DELAY + float(parameters.get("delay", 0))
+            time.sleep(delay)
+
+            matches_path = re.fullmatch(r"/api/players/(\d+)/matches", parts.path)
+            if matches_path:
+                oldest_start_time = time.time() - int(parameters["date"]) * 86400
+                payload = [
+                    match
+                    for match in server.player_matches[int(matches_path.group(1))]
+                    if match["start_time"] >= oldest_start_time
+                ]
+            else:
+                payload = {"path": parts.path}
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def to_comparable(value):
+    """Report rows with WLRecords turned into their printed form, WLRecord has no equality"""
+    if isinstance(value, WLRecord):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: to_comparable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_comparable(item) for item in value]
+    return value
+
+
+class LocalOpenDotaAdapter(requests.adapters.HTTPAdapter):
+    """Sends requests for api.opendota.com to the stub server"""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        request.url = request.url.replace(OPENDOTA_URL, self.base_url, 1)
+        return super().send(request, **kwargs)
+
+
+class StubPlayer:
+    def __init__(self, player_id):
+        self.player_id = player_id
+        self.nick = f"player{player_id}"
+
+
+class StubPlayerPool:
+    def __init__(self, players_list):
+        self.players_list = players_list
+
+    def get_player_list(self):
+        return list(self.players_list)
+
+    def __iter__(self):
+        return iter(self.players_list)
+
+
+class AsyncOpenDotaClientTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenDotaHandler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        cls.server.player_matches = get_player_matches(int(time.time()))
+        cls.server_thread = threading.Thread(
+            target=cls.server.serve_forever, daemon=True
+        )
+        cls.server_thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.hits = Counter()
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+
+        self.saved_state = {
+            name: getattr(CacheHandler, name)
+            for name in (
+                "session",
+                "persistent_cache",
+                "response_cache",
+                "rate_limiter",
+                "circuit_breaker",
+                "metrics",
+                "max_workers",
+            )
+        }
+        session = requests.Session()
+        session.mount(
+            OPENDOTA_URL,
+            LocalOpenDotaAdapter(
+                f"http://127.0.0.1:{self.server.server_port}", pool_maxsize=16
+            ),
+        )
+        CacheHandler.session = session
+        CacheHandler.persistent_cache = None
+        CacheHandler.response_cache = PayloadCache()
+        CacheHandler.rate_limiter = RateLimiter(requests_per_minute=60_000, burst=1000)
+        CacheHandler.circuit_breaker = CircuitBreaker()
+        CacheHandler.metrics = RequestMetrics(log_path=None)
+        CacheHandler.max_workers = 4
+        MatchStore.clear()
+        MatchStore.requested_days = 0
+
+        self.players_list = [StubPlayer(player_id) for player_id in PLAYER_IDS]
+
+    def tearDown(self):
+        CacheHandler.session.close()
+        for name, value in self.saved_state.items():
+            setattr(CacheHandler, name, value)
+        MatchStore.clear()
+        MatchStore.requested_days = 0
+
+    def get_match_list_hits(self):
+        return sum(
+            count
+            for path, count in self.server.hits.items()
+            if re.match(r"/api/players/\d+/matches", path)
+        )
+
+    def test_identical_requests_are_coalesced(self):
+        async def run():
+            client = AsyncOpenDotaClient()
+            url = f"{OPENDOTA_URL}/api/heroes"
+            return await asyncio.gather(*(client.cached_get(url) for _ in range(5)))
+
+        responses = asyncio.run(run())
+
+        self.assertEqual(self.server.hits["/api/heroes"], 1)
+        self.assertTrue(all(response is responses[0] for response in responses))
+        self.assertEqual(responses[0].json(), {"path": "/api/heroes"})
+
+    def test_identical_match_loads_are_coalesced(self):
+        async def run():
+            client = AsyncOpenDotaClient()
+            return await asyncio.gather(
+                *(client.load_player_matches(1, 7) for _ in range(4)),
+                client.load_player_matches(1, 7, significant=True),
+            )
+
+        results = asyncio.run(run())
+
+        # One fetch of the full list and one of the significant list
+        self.assertEqual(self.get_match_list_hits(), 2)
+        self.assertTrue(all(result is results[0] for result in results[:4]))
+        self.assertTrue(results[0]["matches"])
+
+    def test_concurrency_is_bounded(self):
+        async def run():
+            client = AsyncOpenDotaClient(max_concurrency=2)
+            return await asyncio.gather(
+                *(
+                    client.get(f"{OPENDOTA_URL}/api/players/{player_id}")
+                    for player_id in range(8)
+                )
+            )
+
+        responses = asyncio.run(run())
+
+        self.assertEqual(len(responses), 8)
+        self.assertEqual(sum(self.server.hits.values()), 8)
+        self.assertEqual(self.server.max_in_flight, 2)
+
+    def test_fetch_for_players_keeps_pool_order(self):
+        def fetch(player):
+            # Players earlier in the pool answer last
+            delay = (len(PLAYER_IDS) - player.player_id) * REQUEST_DELAY
+            response = CacheHandler.opendota_request_get(
+                f"{OPENDOTA_URL}/api/players/{player.player_id}?delay={delay}"
+            )
+            return response.json()["path"]
+
+        async def run():
+            client = AsyncOpenDotaClient(max_concurrency=len(PLAYER_IDS))
+            return await client.fetch_for_players(self.players_list, fetch)
+
+        paths = asyncio.run(run())
+
+        self.assertEqual(
+            paths, [f"/api/players/{player_id}" for player_id in PLAYER_IDS]
+        )
+        self.assertEqual(self.server.max_in_flight, len(PLAYER_IDS))
+
+    def test_async_reports_match_sync_reports(self):
+        cutoff_date_from = datetime.now() - timedelta(days=5)
+        player_pool = StubPlayerPool(self.players_list)
+
+        async def run():
+            client = AsyncOpenDotaClient()
+            return (
+                await generate_last_week_report_async(self.players_list, client),
+                await generate_winrate_report_async(
+                    self.players_list, 2, cutoff_date_from, client=client
+                ),
+                await get_all_stacks_report_async(
+                    player_pool, 2, _cutoff_date_from=cutoff_date_from, client=client
+                ),
+            )
+
+        async_reports = asyncio.run(run())
+        # The reports are answered from the lists the async client prefetched
+        self.assertEqual(self.get_match_list_hits(), 2 * len(PLAYER_IDS))
+
+        MatchStore.clear()
+        MatchStore.requested_days = 0
+        sync_reports = (
+            generate_last_week_report(self.players_list),
+            generate_winrate_report(self.players_list, 2, cutoff_date_from),
+            get_all_stacks_report(player_pool, 2, _cutoff_date_from=cutoff_date_from),
+        )
+
+        self.assertEqual(to_comparable(async_reports), to_comparable(sync_reports))
+        last_week_report, winrate_report, stacks_report = to_comparable(async_reports)
+        self.assertEqual(len(last_week_report), len(PLAYER_IDS))
+        self.assertEqual(len(winrate_report), len(PLAYER_IDS))
+        self.assertTrue(any(row["stack_record"] != "0–0" for row in stacks_report))
+
+
+if __name__ == "__main__":
+    unittest.main()
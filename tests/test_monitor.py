@@ -0,0 +1,95 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from vintage_stats import data_processing, monitor
+from vintage_stats.history_store import MatchHistoryStore
+from vintage_stats.monitor import ChangeProbe
+from vintage_stats.parse_queue import DONE, REQUESTED, ParseRequestQueue
+
+NEW_MATCH_ID = 8_000_000_009
+PARSED_MATCH_ID = 8_000_000_008
+
+
+class StubPlayer:
+    player_id = 1000
+    nick = "player1000"
+
+
+def get_recent_match(match_id, version):
+    return {
+        "match_id": match_id,
+        "start_time": 1_700_000_000 + match_id % 1000,
+        "hero_id": 1,
+        "player_slot": 0,
+        "radiant_win": True,
+        "party_size": 1,
+        "lobby_type": 7,
+        "kills": 1,
+        "deaths": 2,
+        "assists": 3,
+        "duration": 1800,
+        "game_mode": 22,
+        "version": version,
+    }
+
+
+class ChangeProbeTest(unittest.TestCase):
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = Path(work_dir.name)
+
+        self.parse_queue = ParseRequestQueue(Path(self.work_dir, "parse.sqlite"))
+        history_store = MatchHistoryStore(Path(self.work_dir, "history.sqlite"))
+        for patcher in (
+            mock.patch.object(data_processing, "parse_request_queue", self.parse_queue),
+            mock.patch.object(monitor, "parse_request_queue", self.parse_queue),
+            mock.patch.object(data_processing, "match_history_store", history_store),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.probe = ChangeProbe(Path(self.work_dir, "probe.vsz"))
+        self.player = StubPlayer()
+
+    def test_new_match_queued_by_the_merge_is_unparsed(self):
+        recent_matches = [
+            get_recent_match(NEW_MATCH_ID, None),
+            get_recent_match(PARSED_MATCH_ID, 21),
+        ]
+        # get_match_history_difference puts the recentMatches rows themselves into the history
+        match_history = [recent_matches[0], dict(recent_matches[1])]
+        data_processing.update_player_match_history(
+            self.player, recent_matches, match_history, 1
+        )
+        self.assertEqual(recent_matches[0]["version"], REQUESTED)
+
+        self.probe.record_fetch(self.player, recent_matches)
+
+        head = self.probe.heads[str(self.player.player_id)]
+        self.assertEqual(head["match_id"], NEW_MATCH_ID)
+        self.assertEqual(head["unparsed"], [NEW_MATCH_ID])
+
+    def test_finished_parse_triggers_a_fetch(self):
+        recent_matches = [get_recent_match(NEW_MATCH_ID, None)]
+        data_processing.update_player_match_history(
+            self.player, recent_matches, list(recent_matches), 1
+        )
+        self.probe.record_fetch(self.player, recent_matches)
+
+        connection = self.parse_queue._connect()
+        with connection:
+            connection.execute(
+                "UPDATE parse_requests SET status = ? WHERE match_id = ?",
+                (DONE, NEW_MATCH_ID),
+            )
+
+        with mock.patch.object(monitor, "get_newest_match_id") as get_newest_match_id:
+            self.assertTrue(self.probe.needs_fetch(self.player))
+        get_newest_match_id.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
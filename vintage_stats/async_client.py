@@ -0,0 +1,79 @@
+import asyncio
+import logging
+
+from vintage_stats.cache import CacheHandler
+from vintage_stats.match_store import MatchStore
+
+
+class AsyncOpenDotaClient:
+    """Drives the pooled CacheHandler transport from asyncio.
+    Identical in-flight requests are coalesced into one call and concurrency is bounded by max_concurrency."""
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = max_concurrency or CacheHandler.max_workers
+        self._semaphore = None
+        self._in_flight = {}
+
+    async def _run(self, function, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await asyncio.to_thread(function, *args)
+
+    def _coalesce(self, key, function, *args):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(function, *args))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            logging.debug(f"Coalesced in-flight req: {key}")
+        return asyncio.shield(task)
+
+    async def get(self, response_str):
+        return await self._coalesce(
+            ("get", response_str), CacheHandler.opendota_request_get, response_str
+        )
+
+    async def cached_get(self, response_str):
+        return await self._coalesce(
+            ("cached_get", response_str),
+            CacheHandler.cached_opendota_request_get,
+            response_str,
+        )
+
+    async def get_player_matches(self, player_id, days, significant=False):
+        return await self._coalesce(
+            ("matches", player_id, days, significant),
+            MatchStore.get_matches,
+            player_id,
+            days,
+            None,
+            None,
+            None,
+            significant,
+        )
+
+    async def load_player_matches(self, player_id, days, significant=False):
+        return await self._coalesce(
+            ("load", player_id, days, significant),
+            MatchStore.load,
+            player_id,
+            days,
+            significant,
+        )
+
+    async def prefetch_matches(self, players_list, days, significant=False):
+        """Fetches the match lists of all players at once, finishing as soon as the slowest one does"""
+        return await asyncio.gather(
+            *(
+                self.load_player_matches(player.player_id, days, significant)
+                for player in players_list
+            )
+        )
+
+    async def fetch_for_players(self, players_list, fetch_function):
+        """Async counterpart of CacheHandler.fetch_for_players, results are returned in pool order"""
+        return await asyncio.gather(
+            *(self._run(fetch_function, player) for player in players_list)
+        )
@@ -0,0 +1,738 @@
+import logging
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+import requests.adapters
+
+from vintage_stats.metrics import (
+    CACHE_BYPASS,
+    CACHE_COALESCED,
+    CACHE_MEMORY,
+    CACHE_MISS,
+    CACHE_PERSISTENT,
+    CACHE_REJECTED,
+    RequestMetrics,
+)
+from vintage_stats.serialization import loads_json
+
+DEFAULT_CACHE_PATH = Path(".", "data", "http_cache.sqlite")
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+# Streamed bodies larger than this are not persisted, collecting them would hold the whole body
+# in memory on write and on every hit. Roughly 3000 rows of a player's match list.
+MAX_STREAMED_PERSIST_BYTES = 1024 * 1024
+# Body bytes of decoded responses kept in memory for the run
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+DEFAULT_TTL = 5 * 60
+# OpenDota free tier allows 60 calls per minute
+OPENDOTA_REQUESTS_PER_MINUTE = 60
+DEFAULT_MAX_WORKERS = 4
+# GETs are retried on these statuses and on connection errors, with jittered exponential backoff
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_BASE = 1
+BACKOFF_MAX = 30
+# Consecutive failed requests that open the circuit breaker, and seconds it stays open
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 60
+
+# Time to live in seconds for each OpenDota endpoint, first matching pattern wins
+ENDPOINT_TTLS = [
+    (re.compile(r"/api/heroes$"), 7 * 24 * 60 * 60),
+    (re.compile(r"/api/matches/\d+$"), 30 * 24 * 60 * 60),
+    (re.compile(r"/api/players/\d+$"), 24 * 60 * 60),
+    (re.compile(r"/api/players/\d+/recentMatches$"), 60),
+    (re.compile(r"/api/players/\d+/matches$"), 10 * 60),
+]
+
+
+def normalize_url(url):
+    """Lowercases scheme and host, drops trailing slashes and sorts query parameters."""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+def is_cacheable(response):
+    return 200 <= response.status_code < 300
+
+
+def get_retry_after(response):
+    """Seconds to wait from the Retry-After header, given either as seconds or as an HTTP date"""
+    retry_after = response.headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_backoff(attempt):
+    """Full jitter, a random wait up to the exponential bound, so threads do not retry in lockstep"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+class OpenDotaError(Exception):
+    """OpenDota could not be reached or kept failing after retries"""
+
+
+class CircuitOpenError(OpenDotaError):
+    """Raised without sending a request while the circuit breaker is open"""
+
+
+def get_endpoint_ttl(url):
+    path = urlsplit(url).path.rstrip("/")
+    for pattern, ttl in ENDPOINT_TTLS:
+        if pattern.search(path):
+            return ttl
+    return DEFAULT_TTL
+
+
+class FrozenDict(dict):
+    """Read-only dict of a shared decoded payload, still a dict for serialization and lookups"""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Cached payloads are shared and read-only.")
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+def freeze(value):
+    """Decoded JSON with dicts made read-only and lists turned into tuples"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def get_payload_size(value):
+    """Approximate bytes held by a decoded payload. Dict keys are left out,
+    the JSON decoders share one string object per distinct key."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(get_payload_size(item) for item in value.values())
+    elif isinstance(value, (list, tuple)):
+        size += sum(get_payload_size(item) for item in value)
+    return size
+
+
+_UNDECODED = object()
+
+
+class CachedResponse:
+    """Minimal stand-in for requests.Response rebuilt from a persisted or received body.
+    The body is decoded once on the first json() call and the read-only payload is shared."""
+
+    def __init__(self, url, status_code, content):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.decoded_size = 0
+        self._payload = _UNDECODED
+        # The PayloadCache holding the response, told the decoded size after json()
+        self._cache = None
+
+    @property
+    def size(self):
+        """Body bytes, plus the estimated size of the payload once it was decoded"""
+        return len(self.content) + self.decoded_size
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        if self._payload is _UNDECODED:
+            payload = freeze(loads_json(self.content))
+            decoded_size = get_payload_size(payload)
+            self._payload = payload
+            cache = self._cache
+            if cache is not None:
+                cache.add_decoded_size(self, decoded_size)
+            else:
+                self.decoded_size = decoded_size
+        return self._payload
+
+    def iter_content(self, chunk_size=1):
+        content = memoryview(self.content)
+        for start in range(0, len(content), chunk_size):
+            yield bytes(content[start : start + chunk_size])
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return f"<CachedResponse [{self.status_code}]>"
+
+
+class StreamedResponse:
+    """Live response whose body is read once in chunks through iter_content, never as a whole.
+    When a persistent cache is given, the chunks are also collected and the body is stored
+    there once it was fully read, unless it grew past max_persisted_bytes."""
+
+    def __init__(
+        self,
+        url,
+        response,
+        persistent_cache=None,
+        max_persisted_bytes=MAX_STREAMED_PERSIST_BYTES,
+    ):
+        self.url = url
+        self.status_code = response.status_code
+        self.max_persisted_bytes = max_persisted_bytes
+        self._response = response
+        self._persistent_cache = persistent_cache
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 400
+
+    def iter_content(self, chunk_size=1):
+        persistent_cache = self._persistent_cache
+        body = bytearray() if persistent_cache is not None else None
+        try:
+            for chunk in self._response.iter_content(chunk_size):
+                if body is not None:
+                    body += chunk
+                    if len(body) > self.max_persisted_bytes:
+                        logging.debug(
+                            f"Body of {self.url} is over {self.max_persisted_bytes} bytes, "
+                            f"not persisted."
+                        )
+                        body = None
+                yield chunk
+        finally:
+            self._response.close()
+        # Only reached when the body was read to the end, a partial one is not stored
+        if body is not None:
+            persistent_cache.put(self.url, self.status_code, body)
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return f"<StreamedResponse [{self.status_code}]>"
+
+
+class PayloadCache:
+    """Responses of the run kept in memory as CachedResponse, so each body is decoded only once.
+    Entries are accounted by body size, plus the decoded payload once json() was called,
+    and the least recently used ones are dropped past max_bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BUDGET):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url):
+        with self._lock:
+            response = self._entries.get(url)
+            if response is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url)
+            self.hits += 1
+            return response
+
+    def put(self, url, response):
+        """Stores the response, requests.Response is converted, returns the stored CachedResponse"""
+        if not isinstance(response, CachedResponse):
+            response = CachedResponse(url, response.status_code, response.content)
+        with self._lock:
+            size = response.size
+            if size > self.max_bytes:
+                return response
+            previous = self._entries.pop(url, None)
+            if previous is not None:
+                self.total_bytes -= previous.size
+                previous._cache = None
+            self._entries[url] = response
+            response._cache = self
+            self.total_bytes += size
+            self._evict()
+        return response
+
+    def add_decoded_size(self, response, decoded_size):
+        """Accounts the payload of a stored response decoded after it was put"""
+        with self._lock:
+            if response.decoded_size:
+                return
+            response.decoded_size = decoded_size
+            # Not accounted when it was evicted or replaced meanwhile
+            if response._cache is self:
+                self.total_bytes += decoded_size
+                self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+            evicted._cache = None
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def get_stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class PersistentResponseCache:
+    """SQLite backed response cache keyed by normalized URL, with per-endpoint TTL and LRU eviction"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(
+                str(self.path), check_same_thread=False, isolation_level=None
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT PRIMARY KEY, status INTEGER NOT NULL, body BLOB NOT NULL, "
+                "size INTEGER NOT NULL, stored_at REAL NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+            )
+        return self._connection
+
+    def get(self, url):
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT status, body, expires_at FROM responses WHERE url = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            status, body, expires_at = row
+            if expires_at <= now:
+                connection.execute("DELETE FROM responses WHERE url = ?", (key,))
+                self.misses += 1
+                return None
+            connection.execute(
+                "UPDATE responses SET last_access = ? WHERE url = ?", (now, key)
+            )
+            self.hits += 1
+        logging.debug(f"Persistent cache hit for req: {key}")
+        return CachedResponse(url, status, bytes(body))
+
+    def put(self, url, status_code, content, ttl=None):
+        key = normalize_url(url)
+        if ttl is None:
+            ttl = get_endpoint_ttl(key)
+        if ttl <= 0 or len(content) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, status, body, size, stored_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, status_code, content, len(content), now, now + ttl, now),
+            )
+            self._evict(connection)
+
+    def _evict(self, connection):
+        connection.execute(
+            "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+        )
+        total_size = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        for key, size in connection.execute(
+            "SELECT url, size FROM responses ORDER BY last_access"
+        ).fetchall():
+            connection.execute("DELETE FROM responses WHERE url = ?", (key,))
+            self.evictions += 1
+            total_size -= size
+            if total_size <= self.max_bytes:
+                break
+        logging.debug(f"Persistent cache evicted down to {total_size} bytes.")
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+
+    def get_stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class RateLimiter:
+    """Token bucket shared by all request threads, no rolling minute goes over requests_per_minute.
+    The burst is part of the quota, the bucket refills at what is left of it."""
+
+    def __init__(self, requests_per_minute=OPENDOTA_REQUESTS_PER_MINUTE, burst=10):
+        # At least one request per minute comes from the refill, so the bucket keeps refilling
+        burst = max(1, min(burst, requests_per_minute - 1))
+        self.rate = max(requests_per_minute - burst, 1) / 60
+        self.capacity = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+
+    def pause(self, seconds):
+        """Holds back every thread for the given time, used when OpenDota answers 429"""
+        with self._lock:
+            self._refill()
+            # Overlapping pauses from several threads do not add up
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+        logging.warning(
+            f"Rate limited by OpenDota, pausing requests for {seconds:.1f} s."
+        )
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            logging.debug(f"Rate limit reached, waiting {wait_time:.2f} s.")
+            time.sleep(wait_time)
+
+
+class CircuitBreaker:
+    """Stops sending requests after consecutive failures, so an outage does not burn the quota.
+    After reset_timeout a single trial request is let through, its result closes or reopens the circuit."""
+
+    def __init__(
+        self,
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=CIRCUIT_RESET_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_count = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_in_progress:
+                return False
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logging.info("OpenDota is responding again, circuit closed.")
+            self.failure_count = 0
+            self.opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failure_count += 1
+            if self._trial_in_progress or (
+                self.opened_at is None and self.failure_count >= self.failure_threshold
+            ):
+                logging.error(
+                    f"OpenDota failed {self.failure_count} times in a row, "
+                    f"circuit open for {self.reset_timeout} s."
+                )
+                self.opened_at = time.monotonic()
+            self._trial_in_progress = False
+
+    def is_open(self):
+        with self._lock:
+            return self.opened_at is not None
+
+
+class CacheHandler:
+    response_cache = PayloadCache()
+    requests_count = 0
+    hero_map = None
+    # Set to None to disable the on-disk cache shared between runs
+    persistent_cache = PersistentResponseCache()
+    rate_limiter = RateLimiter()
+    circuit_breaker = CircuitBreaker()
+    metrics = RequestMetrics()
+    max_retries = MAX_RETRIES
+    max_workers = DEFAULT_MAX_WORKERS
+    session = None
+    _count_lock = threading.Lock()
+    _in_flight = {}
+    _in_flight_lock = threading.Lock()
+
+    @staticmethod
+    def get_session():
+        """Keep-alive session shared by all threads, so connections are reused instead of a new TLS handshake per call"""
+        if CacheHandler.session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=max(CacheHandler.max_workers, 1)
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            CacheHandler.session = session
+        return CacheHandler.session
+
+    @staticmethod
+    def _count_request():
+        CacheHandler.rate_limiter.acquire()
+        with CacheHandler._count_lock:
+            CacheHandler.requests_count += 1
+
+    @staticmethod
+    def _send(method, request_url, cache, *args, **kwargs):
+        """Sends the request through the shared session and records its metrics.
+        Only GETs are retried, the last response is returned when retries run out on an error status.
+        Raises OpenDotaError when no response was received."""
+        if not CacheHandler.circuit_breaker.allow():
+            CacheHandler.metrics.record(method, request_url, CACHE_REJECTED)
+            raise CircuitOpenError(f"Circuit open, {method} {request_url} not sent.")
+
+        max_retries = CacheHandler.max_retries if method == "GET" else 0
+        send_function = getattr(CacheHandler.get_session(), method.lower())
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            CacheHandler._count_request()
+            try:
+                response = send_function(request_url, *args, **kwargs)
+            except requests.exceptions.RequestException as e:
+                CacheHandler.circuit_breaker.record_failure()
+                if attempt >= max_retries or CacheHandler.circuit_breaker.is_open():
+                    CacheHandler.metrics.record(
+                        method,
+                        request_url,
+                        cache,
+                        latency=time.perf_counter() - start,
+                        retries=attempt,
+                    )
+                    raise OpenDotaError(f"{method} {request_url} failed: {e}") from e
+                wait_time = get_backoff(attempt)
+                logging.warning(
+                    f"{method} {request_url} failed, retrying in {wait_time:.1f} s, error: {e}."
+                )
+            else:
+                status_code = response.status_code
+                if status_code >= 500:
+                    CacheHandler.circuit_breaker.record_failure()
+                else:
+                    # A 429 means OpenDota is up, only asking us to slow down
+                    CacheHandler.circuit_breaker.record_success()
+                if status_code == 429:
+                    retry_after = get_retry_after(response)
+                    if retry_after is None:
+                        retry_after = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt)
+                    CacheHandler.rate_limiter.pause(retry_after)
+                if (
+                    status_code not in RETRY_STATUSES
+                    or attempt >= max_retries
+                    or CacheHandler.circuit_breaker.is_open()
+                ):
+                    if kwargs.get("stream") and response.ok:
+                        # The body is left unread, the size is the one announced by OpenDota
+                        size = int(response.headers.get("Content-Length", 0))
+                    else:
+                        size = len(response.content)
+                    CacheHandler.metrics.record(
+                        method,
+                        request_url,
+                        cache,
+                        status_code,
+                        time.perf_counter() - start,
+                        size,
+                        attempt,
+                    )
+                    return response
+                # The connection goes back to the pool, a streamed body was never read
+                response.close()
+                # After a 429 the paused rate limiter does the waiting
+                wait_time = 0 if status_code == 429 else get_backoff(attempt)
+                logging.warning(
+                    f"{method} {request_url} returned {status_code}, retry {attempt + 1} of {max_retries}."
+                )
+            attempt += 1
+            time.sleep(wait_time)
+
+    @staticmethod
+    def fetch_for_players(players_list, fetch_function):
+        """Calls fetch_function(player) for every player concurrently, results are returned in pool order"""
+        players_list = list(players_list)
+        if CacheHandler.max_workers <= 1 or len(players_list) <= 1:
+            return [fetch_function(player) for player in players_list]
+        with ThreadPoolExecutor(
+            max_workers=min(CacheHandler.max_workers, len(players_list))
+        ) as executor:
+            return list(executor.map(fetch_function, players_list))
+
+    @staticmethod
+    def opendota_request_get(response_str):
+        response = CacheHandler._send("GET", response_str, CACHE_BYPASS)
+        logging.debug("Uncached req: {}".format(response_str))
+        return response
+
+    @staticmethod
+    def cached_opendota_request_get(response_str):
+        """Responses are kept in memory for the run"""
+        cached_response = CacheHandler.response_cache.get(response_str)
+        if cached_response is not None:
+            logging.debug("Cached used for req: {}".format(response_str))
+            return CacheHandler._record_hit("GET", response_str, cached_response)
+
+        # Identical requests issued by several threads at once share a single call
+        with CacheHandler._in_flight_lock:
+            if response_str in CacheHandler.response_cache:
+                return CacheHandler.response_cache.get(response_str)
+            in_flight_request = CacheHandler._in_flight.get(response_str)
+            is_owner = in_flight_request is None
+            if is_owner:
+                in_flight_request = Future()
+                CacheHandler._in_flight[response_str] = in_flight_request
+        if not is_owner:
+            logging.debug("Waiting for in-flight req: {}".format(response_str))
+            start = time.perf_counter()
+            return CacheHandler._record_hit(
+                "GET", response_str, in_flight_request.result(), CACHE_COALESCED, start
+            )
+
+        try:
+            response = CacheHandler._cached_get(response_str)
+            in_flight_request.set_result(response)
+            return response
+        except Exception as e:
+            in_flight_request.set_exception(e)
+            raise
+        finally:
+            with CacheHandler._in_flight_lock:
+                CacheHandler._in_flight.pop(response_str, None)
+
+    @staticmethod
+    def streamed_opendota_request_get(response_str):
+        """Cached GET for bodies the caller keeps in a more compact form itself, read through
+        iter_content. Not kept in memory, a fetched body is only collected for the persistent cache
+        while it is under MAX_STREAMED_PERSIST_BYTES.
+        Identical requests in flight are not coalesced, a stream can only be read once."""
+        return CacheHandler._cached_get(response_str, stream=True)
+
+    @staticmethod
+    def _cached_get(response_str, stream=False):
+        persistent_cache = CacheHandler.persistent_cache
+        if persistent_cache is not None:
+            start = time.perf_counter()
+            response = persistent_cache.get(response_str)
+            if response is not None:
+                if not stream:
+                    CacheHandler.response_cache.put(response_str, response)
+                return CacheHandler._record_hit(
+                    "GET", response_str, response, CACHE_PERSISTENT, start
+                )
+
+        response = CacheHandler._send("GET", response_str, CACHE_MISS, stream=stream)
+        logging.debug("Cached req: {}".format(response_str))
+        # Error responses are not cached, the next call asks again
+        if not is_cacheable(response):
+            return response
+        if stream:
+            return StreamedResponse(response_str, response, persistent_cache)
+        if persistent_cache is not None:
+            persistent_cache.put(response_str, response.status_code, response.content)
+        return CacheHandler.response_cache.put(response_str, response)
+
+    @staticmethod
+    def _record_hit(method, request_url, response, cache=CACHE_MEMORY, start=None):
+        latency = time.perf_counter() - start if start is not None else 0.0
+        CacheHandler.metrics.record(
+            method,
+            request_url,
+            cache,
+            response.status_code,
+            latency,
+            len(response.content),
+        )
+        return response
+
+    @staticmethod
+    def cached_opendota_request_post(response_str):
+        cached_response = CacheHandler.response_cache.get(response_str)
+        if cached_response is not None:
+            logging.debug("Cached used for req: {}".format(response_str))
+            return CacheHandler._record_hit("POST", response_str, cached_response)
+        else:
+            response = CacheHandler._send("POST", response_str, CACHE_MISS)
+            logging.debug("Cached req: {}".format(response_str))
+            if is_cacheable(response):
+                return CacheHandler.response_cache.put(response_str, response)
+            return response
+
+    @staticmethod
+    def opendota_request_post(request_url):
+        logging.debug(f"opendota_request_post, url: {request_url}")
+        headers = {"content-length": ""}
+        response = CacheHandler._send("POST", request_url, CACHE_BYPASS, headers)
+        # The body is not decoded here, error pages are not JSON
+        logging.debug(f"opendota_request_post, response: {response.status_code}")
+        logging.debug("Uncached req: {}".format(request_url))
+        return response
@@ -1,153 +1,100 @@
 import json
 import logging
-import filecmp
 import os
 import random
 import time
-import pickle
 from pathlib import Path
 from datetime import datetime, timedelta
-from pprint import pformat
 
-import requests
 import timeago
 
+from vintage_stats.cache import CacheHandler, OpenDotaError
 from vintage_stats.constants import GAME_MODES
-from vintage_stats.utility import WLRecord, get_days_since_date
+from vintage_stats.heroes import HeroRegistry
+from vintage_stats.history_store import MatchHistoryStore
+from vintage_stats.match import Match, is_victory
+from vintage_stats.match_details import MatchDetailStore
+
+# get_mmr_change used to live here, it is still importable from this module
+from vintage_stats.mmr import get_mmr_change, get_mmr_timeline  # noqa: F401
+from vintage_stats.parse_queue import ParseRequestQueue
+from vintage_stats.serialization import STATE_SUFFIX, load_state, save_state
+from vintage_stats.stacks import StackIndex
+from vintage_stats.utility import get_days_since_date
 
 logging.basicConfig(level=logging.INFO)
 
 hero_map = None
+match_history_store = MatchHistoryStore()
+parse_request_queue = ParseRequestQueue()
+match_detail_store = MatchDetailStore()
 
+# Schema versions of the local state files
+PLAYER_STATS_SCHEMA_VERSION = 1
+LAST_MATCHES_SCHEMA_VERSION = 1
 
-class CacheHandler:
-    response_cache = {}
-    requests_count = 0
-    hero_map = None
-
-    @staticmethod
-    def opendota_request_get(response_str):
-        response = requests.get(response_str)
-        logging.debug("Uncached req: {}".format(response_str))
-        CacheHandler.requests_count += 1
-        return response
-
-    @staticmethod
-    def cached_opendota_request_get(response_str):
-        if response_str in CacheHandler.response_cache:
-            logging.debug("Cached used for req: {}".format(response_str))
-            return CacheHandler.response_cache[response_str]
-        else:
-            response = requests.get(response_str)
-            logging.debug("Cached req: {}".format(response_str))
-            CacheHandler.requests_count += 1
-            CacheHandler.response_cache[response_str] = response
-            return response
-
-    @staticmethod
-    def cached_opendota_request_post(response_str):
-        if response_str in CacheHandler.response_cache:
-            logging.debug("Cached used for req: {}".format(response_str))
-            return CacheHandler.response_cache[response_str]
-        else:
-            response = requests.post(response_str)
-            logging.debug("Cached req: {}".format(response_str))
-            CacheHandler.requests_count += 1
-            CacheHandler.response_cache[response_str] = response
-            return response
-
-    @staticmethod
-    def opendota_request_post(request_url):
-        logging.debug(f"opendota_request_post, url: {request_url}")
-        headers = {"content-length": ""}
-        response = requests.post(request_url, headers)
-        logging.debug(f"opendota_request_post, response: {response.json()}")
-        logging.debug("Uncached req: {}".format(request_url))
-        CacheHandler.requests_count += 1
-        return response
+# How many days of matches a new player history starts with
+INITIAL_HISTORY_DAYS = 60
+# How many of the newest history matches are requested to be parsed
+PARSE_REQUEST_DEPTH = 40
 
 
 def check_victory(player_match_data):
-    rad_win = bool(player_match_data["radiant_win"])
-    player_on_dire = int(player_match_data["player_slot"]) > 127
-    player_won = (rad_win and not player_on_dire) or (not rad_win and player_on_dire)
-    return player_won
+    """Accepts a Match record or a raw OpenDota match dict"""
+    if isinstance(player_match_data, Match):
+        return player_match_data.won
+    return is_victory(
+        player_match_data["radiant_win"], player_match_data["player_slot"]
+    )
 
 
 def get_file_cached_player_stats(player_id):
-    data_folder_path = Path(".", "data", "players")
-    data_folder_path.mkdir(parents=True, exist_ok=True)
-    players_stats_path = Path(data_folder_path, str(player_id) + "_data.json")
-
-    if Path.is_file(players_stats_path):
-        with open(players_stats_path) as match_file:
-            data = json.load(match_file)
-            CacheHandler.response_cache[
-                "https://api.opendota.com/api/players/{}".format(player_id)
-            ] = data
-            return data
-    else:
+    players_stats_path = Path(".", "data", "players", f"{player_id}{STATE_SUFFIX}")
+    data = load_state(
+        players_stats_path,
+        PLAYER_STATS_SCHEMA_VERSION,
+        legacy_path=Path(".", "data", "players", f"{player_id}_data.json"),
+    )
+    if data is None:
         data = CacheHandler.cached_opendota_request_get(
             "https://api.opendota.com/api/players/{}".format(player_id)
         ).json()
-        dump_file = open(players_stats_path, "w")
-        json.dump(data, dump_file, indent=4)
-        return data
+        save_state(players_stats_path, data, PLAYER_STATS_SCHEMA_VERSION)
+    return data
 
 
 def get_file_cached_match_stats(match_id):
-    data_folder_path = Path(".", "data", "matches")
-    data_folder_path.mkdir(parents=True, exist_ok=True)
-    match_stats_path = Path(data_folder_path, str(match_id) + "_data.json")
-    if Path.is_file(match_stats_path):
-        with open(match_stats_path) as match_file:
-            data = json.load(match_file)
-            CacheHandler.response_cache[
-                "https://api.opendota.com/api/matches/{}".format(match_id)
-            ] = data
-            return data
-    else:
-        data = CacheHandler.cached_opendota_request_get(
-            "https://api.opendota.com/api/matches/{}".format(match_id)
-        ).json()
-        dump_file = open(match_stats_path, "w")
-        json.dump(data, dump_file, indent=4)
-        return data
+    """Match details from the shared match detail store, fetched from OpenDota only once"""
+    return match_detail_store.fetch(match_id)
 
 
 def get_hero_name(hero_id):
-    CacheHandler.hero_map = CacheHandler.cached_opendota_request_get(
-        "https://api.opendota.com/api/heroes"
-    ).json()
-    for hero_node in CacheHandler.hero_map:
-        if int(hero_node["id"]) == hero_id:
-            return hero_node["localized_name"]
-    return "Not Found"
-
-
-def get_mmr_change(player_won, was_party):
-    sign = 1 if player_won else -1
-    return (20 + int((not was_party) * 10)) * sign
+    return HeroRegistry.get_name(hero_id)
 
 
 def get_requests_count():
     return CacheHandler.requests_count
 
 
+def get_cache_stats():
+    if CacheHandler.persistent_cache is None:
+        return {"hits": 0, "misses": 0, "evictions": 0}
+    return CacheHandler.persistent_cache.get_stats()
+
+
 def log_requests_count():
-    request_log_path = Path("request.log")
-    if not request_log_path.exists():
-        with open("request.log", "w") as request_log:
-            request_log.write("0")
-    requests_count_history = 0
-    with open("request.log", "r+") as request_log:
-        for line in request_log:
-            requests_count_history = int(line)
-    with open("request.log", "w") as request_log:
-        logging.debug(
-            f"Requests used this run: {get_requests_count()}, requests_count_history: {requests_count_history}."
-        )
-        request_log.write("{}".format(get_requests_count() + requests_count_history))
+    """Logs requests sent this run by endpoint, every single request is in the metrics JSON-lines log"""
+    logging.debug(f"Requests used this run: {get_requests_count()}.")
+    for endpoint, cache_summary in CacheHandler.metrics.get_summary().items():
+        for cache, totals in cache_summary.items():
+            logging.debug(
+                f"{endpoint} from {cache}: {totals['count']} requests, "
+                f"{totals['latency']:.2f} s, {totals['bytes']} bytes, {totals['retries']} retries."
+            )
+    logging.debug(f"Persistent cache stats this run: {get_cache_stats()}.")
+    logging.debug(
+        f"Memory cache stats this run: {CacheHandler.response_cache.get_stats()}."
+    )
 
 
 def get_stack_wl(
@@ -161,124 +108,57 @@ def get_stack_wl(
     if len(players_list) <= 1:
         logging.debug("Stack needs to have at least 2 members.")
         return None
-    if excluded_players is not None:
-        excluded_players_copy = excluded_players.get_player_list().copy()
-    else:
-        excluded_players_copy = None
-    if exclusive:
-        for player in players_list:
-            excluded_players_copy.remove(player)
-
-    # Default values
-    cutoff_date_from = datetime.now() - timedelta(days=28)
-    cutoff_date_to = datetime.now()
-
-    if _cutoff_date_from is not None:
-        cutoff_date_from = _cutoff_date_from
 
-    if _cutoff_date_to is not None:
-        cutoff_date_to = _cutoff_date_to
-
-    days_since_cutoff = get_days_since_date(cutoff_date_from)
-
-    match_sets = []
-    result_map = {}
-
-    # Find set of played matches for each player, track down its result and then intersect those sets
-    # thus gaining only matches that all players played
-    for player in players_list:
-        response_str = "https://api.opendota.com/api/players/{}/matches?lobby_type=7&date={}".format(
-            player.player_id, days_since_cutoff
-        )
-        matches_response = CacheHandler.cached_opendota_request_get(response_str)
-
-        player_matches_set = set()
-        for match in matches_response.json():
-            match_datetime = datetime.fromtimestamp(match["start_time"])
-            if match_datetime < cutoff_date_from or match_datetime > cutoff_date_to:
-                continue
-            player_matches_set.add(int(match["match_id"]))
-            check_victory(match)
-            result_map[match["match_id"]] = check_victory(match)
-        match_sets.append(player_matches_set)
-
-    excluded_matches_set = set()
+    indexed_players = list(players_list)
     if exclusive:
-        for player in excluded_players_copy:
-            response_str = "https://api.opendota.com/api/players/{}/matches?lobby_type=7&date={}".format(
-                player.player_id, days_since_cutoff
-            )
-            matches_response = CacheHandler.cached_opendota_request_get(response_str)
-
-            for match in matches_response.json():
-                excluded_matches_set.add(int(match["match_id"]))
+        for player in excluded_players.get_player_list():
+            if player not in players_list:
+                indexed_players.append(player)
 
-    stacked_matches_set = set.intersection(*match_sets) - excluded_matches_set
-
-    wins = losses = 0
-    for match in stacked_matches_set:
-        if result_map[match]:
-            wins = wins + 1
-        else:
-            losses = losses + 1
-    stack_record = WLRecord(wins, losses)
-
-    return stack_record
+    stack_index = StackIndex(indexed_players, _cutoff_date_from, _cutoff_date_to)
+    return stack_index.get_stack_record(players_list, exclusive)
 
 
 def request_match_parse(match_id):
-    logging.debug(f"\trequest_match_parse function for {match_id}")
-    requested_set_file_path = Path("parse_requested.pickle")
-    parse_requested_dict = {}
-
-    if requested_set_file_path.exists():
-        logging.debug("\trequest_match_parse pickle file exists")
-        with requested_set_file_path.open(mode="rb") as requested_file:
-            parse_requested_dict = pickle.load(requested_file)
-            logging.debug("\trequest_match_parse pickle file loaded")
-
-    if match_id in parse_requested_dict and parse_requested_dict[match_id] > 2:
-        logging.debug("\trequest_match_parse match was already requested 3 times.")
-        return None
-
-    response_str = f"https://api.opendota.com/api/request/{match_id}"
-    response = CacheHandler.opendota_request_post(response_str)
-
-    if match_id in parse_requested_dict:
-        parse_requested_dict[match_id] += 1
-    else:
-        parse_requested_dict[match_id] = 1
-    logging.debug(f"Sorted requested dict: {pformat(parse_requested_dict)}")
+    """Queues the match for parsing, queued requests are sent by flush_parse_requests"""
+    if parse_request_queue.enqueue(match_id):
+        logging.debug(f"Match {match_id} queued for parsing.")
+        return True
+    return False
 
-    with requested_set_file_path.open(mode="wb") as requested_file:
-        pickle.dump(parse_requested_dict, requested_file)
-        logging.debug("\trequest_match_parse saved to pickle file")
 
-    if response:
-        logging.debug(
-            f"Parse request for match_id {match_id} response: {pformat(response.json())}"
-        )
-    return response
+def flush_parse_requests():
+    return parse_request_queue.flush()
 
 
 def get_last_matches_map(players_list, days_threshold=7):
     last_matches_map = {}
-    last_matches_map_file_path = Path("lastmatches.json")
-    last_matches_map_file_path_temp = Path("lastmatches_new.json")
+    last_matches_map_file_path = Path(f"lastmatches{STATE_SUFFIX}")
 
-    is_initial_run = False
-    if last_matches_map_file_path.exists():
-        with open("lastmatches.json") as last_matches_map_file:
-            last_matches_map_old = json.load(last_matches_map_file)
-    else:
-        is_initial_run = True
+    last_matches_map_old = load_state(
+        last_matches_map_file_path,
+        LAST_MATCHES_SCHEMA_VERSION,
+        legacy_path=Path("lastmatches.json"),
+    )
+    is_initial_run = last_matches_map_old is None
 
-    for listed_player in players_list:
+    def get_matches_response(player):
         response_str = "https://api.opendota.com/api/players/{}/matches?significant=0&date={}".format(
-            listed_player.player_id, days_threshold
+            player.player_id, days_threshold
         )
-        matches_response = CacheHandler.opendota_request_get(response_str)
+        try:
+            return CacheHandler.opendota_request_get(response_str)
+        except OpenDotaError as e:
+            logging.error(
+                f"Could not get matches for player {player.nick}, error: {e}."
+            )
+            return None
 
+    players_list = list(players_list)
+    matches_responses = CacheHandler.fetch_for_players(
+        players_list, get_matches_response
+    )
+    for listed_player, matches_response in zip(players_list, matches_responses):
         if not matches_response:
             logging.error(
                 f"Missing matches response for player {listed_player.nick}. Replaced with previous data."
@@ -290,8 +170,10 @@ def get_last_matches_map(players_list, days_threshold=7):
             continue
 
         logging.debug(listed_player)
-        if matches_response.json()[:1]:
-            last_match = matches_response.json()[:1][0]
+        # Decoded once, the body is not parsed again for every field
+        matches = matches_response.json()
+        if matches:
+            last_match = matches[0]
             game_mode = last_match["game_mode"]
             kills = last_match["kills"]
             deaths = last_match["deaths"]
@@ -331,21 +213,20 @@ def get_last_matches_map(players_list, days_threshold=7):
             )
             last_matches_map[listed_player.nick] = match_data
 
-    json.dump(last_matches_map, open(last_matches_map_file_path_temp, "w"), indent=4)
-
+    # Compared in memory, the file is rewritten only when the map changed
     if is_initial_run:
-        json.dump(last_matches_map, open(last_matches_map_file_path, "w"), indent=4)
-
-    check = filecmp.cmp("lastmatches.json", "lastmatches_new.json")
-    if not check:
-        logging.debug("Lastmatches files differed, saving a copy of the old.")
+        save_state(
+            last_matches_map_file_path, last_matches_map, LAST_MATCHES_SCHEMA_VERSION
+        )
+    elif last_matches_map != last_matches_map_old:
+        logging.debug("Lastmatches differed, saving a copy of the old.")
         timestamp = time.strftime("%Y%m%d_%H%M%S")
-        os.rename("lastmatches.json", f"lastmatches_{timestamp}.json")
-        os.rename("lastmatches_new.json", "lastmatches.json")
+        os.rename(last_matches_map_file_path, f"lastmatches_{timestamp}{STATE_SUFFIX}")
+        save_state(
+            last_matches_map_file_path, last_matches_map, LAST_MATCHES_SCHEMA_VERSION
+        )
     else:
-        logging.debug("Lastmatches files were identical, keeping only one.")
-        os.remove("lastmatches.json")
-        os.rename("lastmatches_new.json", "lastmatches.json")
+        logging.debug("Lastmatches were identical, keeping the file.")
 
     return last_matches_map
 
@@ -454,128 +335,111 @@ def get_mmr_history_table(
         start_date = datetime.fromisoformat(_start_date_string)
     if _end_date_string:
         end_date = datetime.fromisoformat(_end_date_string)
-    response_str = (
-        "https://api.opendota.com/api/players/{}/matches?lobby_type=7&date={}".format(
-            player.player_id, get_days_since_date(start_date)
-        )
+    mmr_timeline = get_mmr_timeline(
+        player, {match_id_with_known_mmr: known_mmr_amount}, start_date, end_date
     )
-    matches_response = CacheHandler.cached_opendota_request_get(response_str)
+    if not mmr_timeline:
+        return []
+    return mmr_timeline.get_records()
 
-    match_map = []
-    known_mmr_idx = None
-    used_idx = 0
 
-    for match in matches_response.json():
-        match_datetime = datetime.fromtimestamp(match["start_time"])
-        if match_datetime < start_date:
-            continue
-        if match_datetime > end_date:
-            continue
+def load_match_history_file(player_history_path):
+    """Returns the history stored in the file, or None if it is missing, unreadable or empty"""
+    try:
+        with player_history_path.open(mode="r") as player_history_file:
+            player_history = json.load(player_history_file)
+    except Exception as e:
+        logging.error(f"Match history file {player_history_path} loading error: {e}")
+        return None
 
-        match_id = int(match["match_id"])
-        if match["party_size"] is None:
-            was_party = False
-        else:
-            was_party = int(match["party_size"]) > 1
-
-        player_won = check_victory(match)
-        mmr_change = get_mmr_change(player_won, was_party)
-        mmr_after = None
-
-        if match_id == match_id_with_known_mmr:
-            mmr_after = known_mmr_amount
-            known_mmr_idx = used_idx
-        match_record = {
-            "match_id": match_id,
-            "mmr_after": mmr_after,
-            "won": player_won,
-            "party": was_party,
-            "mmr_change": mmr_change,
-            "start_time": match_datetime,
-            "start_time_string": match_datetime.strftime("%d-%b-%Y"),
-        }
-        used_idx = used_idx + 1
-        match_map.append(match_record)
-
-    if match_map is None or known_mmr_idx is None:
-        return []
+    if (
+        not player_history
+        or not isinstance(player_history, list)
+        or not player_history[0]["match_id"]
+    ):
+        return None
+    return player_history
 
-    prev_mmr = None
-    prev_change = None
-
-    # Iterate from the known point to the past
-    # Match map from Opendota data is from newest to latest
-    for match_record in match_map[known_mmr_idx:]:
-        if match_record["mmr_after"]:
-            prev_mmr = match_record["mmr_after"]
-            prev_change = match_record["mmr_change"]
-        if prev_mmr and prev_change and not match_record["mmr_after"]:
-            match_record["mmr_after"] = prev_mmr - prev_change
-            prev_mmr = prev_mmr - prev_change
-            prev_change = match_record["mmr_change"]
-
-    # Iterate from the known point to the present
-    for match_record in reversed(match_map[: known_mmr_idx + 1]):
-        if match_record["mmr_after"]:
-            prev_mmr = match_record["mmr_after"]
-            prev_change = match_record["mmr_change"]
-        if prev_mmr and prev_change and not match_record["mmr_after"]:
-            match_record["mmr_after"] = prev_mmr + prev_change
-            prev_mmr = prev_mmr + prev_change
-            prev_change = match_record["mmr_change"]
-
-    return list(reversed(match_map))
 
+def sync_player_match_history(player, match_history):
+    """Prepends matches played after the newest stored one to match_history.
+    Only the days since that match are requested, an empty history is started from the last INITIAL_HISTORY_DAYS days.
+    Returns the list of new matches, newest first."""
+    if match_history:
+        newest_match = match_history[0]
+        days_since_newest = get_days_since_date(
+            datetime.fromtimestamp(newest_match["start_time"])
+        )
+    else:
+        newest_match = None
+        days_since_newest = INITIAL_HISTORY_DAYS
 
-def get_player_match_history(player):
-    logging.debug(f"get_player_match_history for {player}")
-    match_history_dir_path = Path("match_histories")
-    player_history_path = match_history_dir_path / f"{player.player_id}_history.json"
-    player_history = None
+    response_str = f"https://api.opendota.com/api/players/{player.player_id}/matches?significant=0&date={days_since_newest}"
+    try:
+        matches_response = CacheHandler.opendota_request_get(response_str)
+    except OpenDotaError as e:
+        logging.error(
+            f"Could not sync match history for player {player.nick}, error: {e}."
+        )
+        return []
+    if not matches_response:
+        logging.error(f"Could not sync match history for player {player.nick}.")
+        return []
 
-    if player_history_path.exists():
-        history_file_error = False
-        with player_history_path.open(mode="r") as player_history_file:
-            logging.debug(f"get_player_match_history file exists for {player}")
+    new_matches = matches_response.json()
+    if newest_match is not None:
+        known_match_ids = set()
+        for match in match_history:
+            if match["start_time"] < newest_match["start_time"]:
+                break
+            known_match_ids.add(match["match_id"])
+        new_matches = [
+            match
+            for match in new_matches
+            if match["start_time"] >= newest_match["start_time"]
+            and match["match_id"] not in known_match_ids
+        ]
+    new_matches.sort(key=lambda match: match["start_time"], reverse=True)
 
-            try:
-                player_history = json.load(player_history_file)
-            except Exception as e:
-                logging.error(f"get_player_match_history file loading error: {e}")
-                history_file_error = True
+    logging.debug(
+        f"Synced {len(new_matches)} new matches for player {player.nick}, window {days_since_newest} days."
+    )
+    match_history[:0] = new_matches
+    return new_matches
 
-            if (
-                not player_history
-                or not isinstance(player_history, list)
-                or not player_history[0]["match_id"]
-            ):
-                history_file_error = True
 
-        if history_file_error:
-            logging.error(
-                f"get_player_match_history existing file is invalid or empty for {player}"
+def load_legacy_match_history(player):
+    """Reads the newest valid match history JSON file written before the history store existed"""
+    match_history_dir_path = Path("match_histories")
+    player_history_paths = [match_history_dir_path / f"{player.player_id}_history.json"]
+    player_history_paths += sorted(
+        match_history_dir_path.glob(f"{player.player_id}_history_old*.json"),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+    for player_history_path in player_history_paths:
+        if not player_history_path.exists():
+            continue
+        player_history = load_match_history_file(player_history_path)
+        if player_history is not None:
+            logging.info(
+                f"Importing match history for {player} from {player_history_path}."
             )
+            return player_history
+    return []
 
-            with player_history_path.open(mode="w") as player_history_file:
-                player_history_file.truncate(0)
-                response_str = f"https://api.opendota.com/api/players/{player.player_id}/matches?significant=0&date=90"
-                player_history = CacheHandler.opendota_request_get(response_str).json()
-                # trim to 40 games
-                if len(player_history) > 40:
-                    player_history = player_history[:40]
-                json.dump(player_history, player_history_file, indent=4)
 
+def get_player_match_history(player):
+    logging.debug(f"get_player_match_history for {player}")
+    player_history = match_history_store.load_history(player.player_id)
+    if player_history:
         return player_history
-    else:
-        with player_history_path.open(mode="w") as player_history_file:
-            logging.debug(f"get_player_match_history file does not exist for {player}")
-            response_str = f"https://api.opendota.com/api/players/{player.player_id}/matches?significant=0&date=60"
-            player_history = CacheHandler.opendota_request_get(response_str).json()
-            # trim to 40 games
-            if len(player_history) > 40:
-                player_history = player_history[:40]
-            json.dump(player_history, player_history_file, indent=4)
-            return player_history
+
+    logging.debug(f"get_player_match_history store is empty for {player}")
+    player_history = load_legacy_match_history(player)
+    sync_player_match_history(player, player_history)
+    match_history_store.upsert_history(player.player_id, player_history)
+    return player_history
 
 
 def update_player_match_history(
@@ -584,17 +448,13 @@ def update_player_match_history(
     # Update older matches in match history if recentMatches has more
     update_flag = False
     logging.debug(f"Checking for new data for player history of player {player.nick}")
-    for idx, history_match in enumerate(
-        previous_match_history[common_history_point:20]
-    ):
-        matching_recent_match = recent_matches[idx + common_history_point]
-        if matching_recent_match["match_id"] != history_match["match_id"]:
-            logging.error(
-                f"Mismatch between match ID order of history and recent matches, idx {idx},"
-                f" history match ID {history_match['match_id']},"
-                f" recent match ID {matching_recent_match['match_id']}."
-            )
-            break
+    recent_by_match_id = {match["match_id"]: match for match in recent_matches}
+    # recentMatches can only hold matches among the newest of the history
+    history_depth = (common_history_point or 0) + len(recent_matches)
+    for idx, history_match in enumerate(previous_match_history[:history_depth]):
+        matching_recent_match = recent_by_match_id.get(history_match["match_id"])
+        if matching_recent_match is None:
+            continue
 
         if (
             len(history_match) <= len(matching_recent_match)
@@ -602,25 +462,18 @@ def update_player_match_history(
             and matching_recent_match["version"] != "requested"
             and history_match != matching_recent_match
         ):
-            previous_match_history[idx + common_history_point] = matching_recent_match
+            previous_match_history[idx] = matching_recent_match
             logging.debug(
                 f"Extended info for match ID {history_match['match_id']} based on data from "
                 f"recentMatches."
             )
             update_flag = True
 
-    def get_match_data_from_recent_matches(match_id, recent_matches):
-        for match in recent_matches:
-            if match["match_id"] == match_id:
-                return match
-        return None
-
     request_count = 0
-    for item in previous_match_history:
+    # History is unbounded, only recent games are worth a parse request
+    for item in previous_match_history[:PARSE_REQUEST_DEPTH]:
         if item["version"] == "requested":
-            recent_match = get_match_data_from_recent_matches(
-                item["match_id"], recent_matches
-            )
+            recent_match = recent_by_match_id.get(item["match_id"])
             if (
                 recent_match
                 and recent_match["version"]
@@ -647,112 +500,92 @@ def update_player_match_history(
 
 def save_player_match_history(player, match_history):
     logging.debug(f"save_player_match_history for {player}")
-    match_history_dir_path = Path("match_histories")
-    player_history_path = match_history_dir_path / f"{player.player_id}_history.json"
-    player_history_path_old = (
-        match_history_dir_path / f"{player.player_id}_history_old.json"
+    changed_count = match_history_store.upsert_history(player.player_id, match_history)
+    logging.debug(
+        f"save_player_match_history stored {changed_count} changed matches for {player}"
     )
-
-    if player_history_path.exists():
-        os.rename(player_history_path, player_history_path_old)
-
-    with player_history_path.open(mode="w") as player_history_file:
-        player_history = match_history
-        # trim to 40 games
-        if len(player_history) > 40:
-            player_history = player_history[:40]
-        json.dump(player_history, player_history_file, indent=4)
-        logging.debug(f"save_player_match_history succesful for {player}")
-        if player_history_path_old.exists():
-            check = filecmp.cmp(player_history_path, player_history_path_old)
-            if not check:
-                logging.debug(
-                    f"Match history for player {player} differed, saving a copy."
-                )
-                timestamp = time.strftime("%Y%m%d_%H%M%S")
-                os.rename(
-                    player_history_path_old,
-                    f"match_histories/{player.player_id}_history_old_{timestamp}.json",
-                )
-        return True
+    return True
 
 
 def handle_recent_matches_file(response_json, player):
-    match_history_dir_path = Path("match_histories")
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    player_recent_matches_path = (
-        match_history_dir_path / f"{player.player_id}_recentMatches.json"
-    )
-    player_recent_matches_path_archive = (
-        match_history_dir_path / f"{player.player_id}_recentMatches_{timestamp}.json"
+    changed_count = match_history_store.upsert_recent_matches(
+        player.player_id, response_json
     )
-
-    if player_recent_matches_path.exists():
-        os.rename(player_recent_matches_path, player_recent_matches_path_archive)
-
-    with player_recent_matches_path.open(mode="w") as player_recent_matches_file:
-        recent_matches = response_json
-        json.dump(recent_matches, player_recent_matches_file, indent=4)
-        logging.debug(
-            f"Saving recentMatches for player {player} to file {player_recent_matches_path}"
-        )
-
-    if player_recent_matches_path_archive.exists():
+    if changed_count:
         logging.debug(
-            f"Comparing {player_recent_matches_path} and {player_recent_matches_path_archive}."
-        )
-        check = filecmp.cmp(
-            player_recent_matches_path, player_recent_matches_path_archive
+            f"Recent matches for player {player} differed in {changed_count} matches, changes recorded."
         )
-        if check:
-            logging.debug(
-                f"Match history for player {player} identical, removing the copy."
-            )
-            os.remove(player_recent_matches_path_archive)
-        else:
-            logging.debug(
-                f"Match history for player {player} differed, keeping a copy."
-            )
+    else:
+        logging.debug(f"Recent matches for player {player} identical.")
 
 
 def get_match_history_difference(
     player, recent_matches, previous_match_history, match_id_to_match_listing
 ):
-    common_history_point = 0
-    for idx, match in enumerate(recent_matches):
-        if match["match_id"] == previous_match_history[0]["match_id"]:
-            common_history_point = idx
-
-    # If common history point is 0, there are no new matches
-    if common_history_point:
-        new_matches = [x["match_id"] for x in recent_matches[:common_history_point]]
-
-        for match in recent_matches[:common_history_point]:
-            if match["match_id"] not in match_id_to_match_listing:
-                match_id_to_match_listing[match["match_id"]] = MatchListing(
-                    player, match
-                )
+    """Prepends matches of recent_matches newer than the history to it and lists them.
+    When recentMatches does not reach back to the newest history match, more games were played
+    than it holds, the gap is filled from the match list by sync_player_match_history.
+    Returns the listings and the count of new matches at the start of the history,
+    None if the gap could not be filled and nothing was merged."""
+    newest_match = previous_match_history[0]
+    recent_by_match_id = {match["match_id"]: match for match in recent_matches}
+
+    if newest_match["match_id"] not in recent_by_match_id and (
+        recent_matches[-1]["start_time"] > newest_match["start_time"]
+    ):
+        logging.info(
+            f"Newest history match {newest_match['match_id']} of player {player.nick} "
+            f"is older than recentMatches, syncing the gap."
+        )
+        new_match_count = len(sync_player_match_history(player, previous_match_history))
+        if not new_match_count:
+            logging.error(
+                f"Could not fill the match history gap of player {player.nick}, "
+                f"merging in a later cycle."
+            )
+            return match_id_to_match_listing, None
+        # recentMatches rows carry more fields than the match list, they replace the synced ones
+        previous_match_history[:new_match_count] = [
+            recent_by_match_id.get(match["match_id"], match)
+            for match in previous_match_history[:new_match_count]
+        ]
+    else:
+        # Only history matches as old as the oldest recent one can be among them
+        oldest_start_time = recent_matches[-1]["start_time"]
+        known_match_ids = set()
+        for match in previous_match_history:
+            if match["start_time"] < oldest_start_time:
+                break
+            known_match_ids.add(match["match_id"])
+        new_matches = [
+            match
+            for match in recent_matches
+            if match["match_id"] not in known_match_ids
+            and match["start_time"] >= newest_match["start_time"]
+        ]
+        new_match_count = len(new_matches)
+        previous_match_history[:0] = new_matches
+
+    # If the count is 0, there are no new matches
+    if new_match_count:
+        for match_data in previous_match_history[:new_match_count]:
+            match = Match.from_dict(match_data)
+            if match.match_id not in match_id_to_match_listing:
+                match_id_to_match_listing[match.match_id] = MatchListing(player, match)
             else:
-                match_id_to_match_listing[match["match_id"]].add_match(player, match)
+                match_id_to_match_listing[match.match_id].add_match(player, match)
 
         logging.debug(
-            f"Found the sync between history and new recent matches, it is match with ID: "
-            f"{recent_matches[common_history_point]['match_id']}"
+            f"Added {new_match_count} new matches to matchHistory of player {player}: "
+            f"{[match['match_id'] for match in previous_match_history[:new_match_count]]}"
         )
-        logging.debug(f"New matches are: {new_matches}")
 
-        for item in recent_matches[:common_history_point]:
-            logging.debug(
-                f"Adding match with ID: {item['match_id']} to matchHistory of player {player}."
-            )
-            previous_match_history.insert(0, item)
-
-    return match_id_to_match_listing, common_history_point
+    return match_id_to_match_listing, new_match_count
 
 
 class MatchListing:
     """Holds information about a match in format that allows easy printing out.
-    All the involved tracked players and their respective match data."""
+    All the involved tracked players and their respective Match records."""
 
     def __init__(self, player, player_match_data):
         self.is_vintage_party = False
@@ -784,19 +617,17 @@ class MatchListing:
             )
             player_string.capitalize()
             game_mode_string = GAME_MODES.get(
-                str(match_generic["game_mode"]), "Unknown Mode"
+                str(match_generic.game_mode), "Unknown Mode"
             )
 
             ownage_total = 0.0
             for match in player_match_data:
-                ownage_total += (match["kills"] + match["assists"]) / (
-                    match["deaths"] or 0.5
-                )
+                ownage_total += (match.kills + match.assists) / (match.deaths or 0.5)
             ownage_rating = ownage_total / len(players_involved)
 
-            result_string = "WON" if check_victory(match_generic) else "LOST"
+            result_string = "WON" if match_generic.won else "LOST"
             logging.debug(f"ownage_rating: {ownage_rating}")
-            if check_victory(match_generic):
+            if match_generic.won:
                 result_string = "WON"
                 if 5.0 <= ownage_rating < 7.5:
                     result_string = "OWNED"
@@ -804,9 +635,9 @@ class MatchListing:
                     result_string = "TOTALLY OWNED"
                 elif ownage_rating >= 10:
                     result_string = "ABSOLUTELY STOMPED"
-            time_played = datetime.fromtimestamp(match_generic["start_time"])
+            time_played = match_generic.start_dt
             minutes_ago = int((datetime.now() - time_played).total_seconds() / 60)
-            game_duration = int(match_generic["duration"] / 60)
+            game_duration = int(match_generic.duration / 60)
             time_ago_string = (
                 "{} minutes ago".format(minutes_ago)
                 if minutes_ago < 120
@@ -818,26 +649,26 @@ class MatchListing:
             )
             for idx, player in enumerate(self.players):
                 match = self.player_match_data[idx]
-                player_hero = get_hero_name(match["hero_id"])
+                player_hero = get_hero_name(match.hero_id)
                 print(
-                    f"**{player.nick}** played **{player_hero}** and went **{match['kills']}-{match['deaths']}-{match['assists']}**."
+                    f"**{player.nick}** played **{player_hero}** and went **{match.kills}-{match.deaths}-{match.assists}**."
                 )
             print(
                 f"The game started {time_ago_string} and lasted {game_duration:.0f} minutes."
-                f"\nLink: <https://www.stratz.com/matches/{match_generic['match_id']}>"
+                f"\nLink: <https://www.stratz.com/matches/{match_generic.match_id}>"
             )
         else:
             player = self.players[0]
             match = self.player_match_data[0]
-            ownage_rating = (match["kills"] + match["assists"]) / match["deaths"]
-            game_mode_string = GAME_MODES.get(str(match["game_mode"]), "Unknown Mode")
-            result_string = "WON" if check_victory(match) else "LOST"
+            ownage_rating = (match.kills + match.assists) / max(match.deaths, 1)
+            game_mode_string = GAME_MODES.get(str(match.game_mode), "Unknown Mode")
+            result_string = "WON" if match.won else "LOST"
             if result_string == "WON" and ownage_rating > 4.0:
                 result_string = "TOTALLY OWNED"
-            time_played = datetime.fromtimestamp(match["start_time"])
+            time_played = match.start_dt
             minutes_ago = int((datetime.now() - time_played).total_seconds() / 60)
-            player_hero = get_hero_name(match["hero_id"])
-            game_duration = int(match["duration"] / 60)
+            player_hero = get_hero_name(match.hero_id)
+            game_duration = int(match.duration / 60)
             time_ago_string = (
                 "{} minutes ago".format(minutes_ago)
                 if minutes_ago < 120
@@ -849,10 +680,10 @@ class MatchListing:
                 f"*{result_string}**."
             )
             print(
-                f"**{player.nick}** played **{player_hero}** and went **{match['kills']}-{match['deaths']}-{match['assists']}**."
+                f"**{player.nick}** played **{player_hero}** and went **{match.kills}-{match.deaths}-{match.assists}**."
             )
             print(
-                f"The game started {time_ago_string} and lasted {game_duration:.0f} minutes. Link: <https://www.stratz.com/matches/{match['match_id']}>"
+                f"The game started {time_ago_string} and lasted {game_duration:.0f} minutes. Link: <https://www.stratz.com/matches/{match.match_id}>"
             )
         return listing_string
 
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from pathlib import Path
+
+from vintage_stats.cache import CacheHandler
+from vintage_stats.serialization import STATE_SUFFIX, load_state, save_state
+
+DEFAULT_HERO_SNAPSHOT_PATH = Path(".", "data", f"heroes{STATE_SUFFIX}")
+LEGACY_HERO_SNAPSHOT_PATH = Path(".", "data", "heroes.json")
+HERO_SNAPSHOT_VERSION = 1
+# Snapshots older than this are refreshed in the background
+HERO_SNAPSHOT_MAX_AGE = 7 * 24 * 60 * 60
+# Background refreshes are not started again sooner than this after the last one
+HERO_REFRESH_MIN_INTERVAL = 10 * 60
+
+
+class HeroRegistry:
+    """Hero ID to name lookup built once per run.
+    Loaded from an on-disk snapshot so it works without network, refreshed from OpenDota in the background."""
+
+    snapshot_path = DEFAULT_HERO_SNAPSHOT_PATH
+    hero_names = {}
+    # List indexed directly by hero ID, None for unused IDs
+    hero_names_by_id = []
+    fetched_at = None
+    _loaded = False
+    _refresh_thread = None
+    _last_refresh_started_at = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_name(hero_id):
+        if not HeroRegistry._loaded:
+            HeroRegistry.load()
+        if hero_id is None:
+            return "Not Found"
+        hero_names_by_id = HeroRegistry.hero_names_by_id
+        if 0 <= hero_id < len(hero_names_by_id) and hero_names_by_id[hero_id]:
+            return hero_names_by_id[hero_id]
+        # Most likely a hero released after the snapshot was taken
+        HeroRegistry.refresh_in_background()
+        return "Not Found"
+
+    @staticmethod
+    def load():
+        with HeroRegistry._lock:
+            if HeroRegistry._loaded:
+                return
+            snapshot = HeroRegistry._read_snapshot()
+            if snapshot is not None:
+                HeroRegistry._set_heroes(snapshot["heroes"], snapshot["fetched_at"])
+            HeroRegistry._loaded = True
+
+        if snapshot is None:
+            HeroRegistry.refresh()
+        elif time.time() - snapshot["fetched_at"] > HERO_SNAPSHOT_MAX_AGE:
+            HeroRegistry.refresh_in_background()
+
+    @staticmethod
+    def refresh():
+        """Fetches heroes from OpenDota and replaces the snapshot, keeps the current one on failure"""
+        # Not cached, a cached response could be the stale list missing the new hero
+        try:
+            heroes_response = CacheHandler.opendota_request_get(
+                "https://api.opendota.com/api/heroes"
+            )
+            if not heroes_response:
+                logging.error(
+                    f"Could not refresh heroes, status {heroes_response.status_code}."
+                )
+                return False
+            heroes = {
+                int(hero_node["id"]): hero_node["localized_name"]
+                for hero_node in heroes_response.json()
+            }
+        except Exception as e:
+            logging.error(f"Could not refresh heroes, error: {e}.")
+            return False
+
+        fetched_at = time.time()
+        with HeroRegistry._lock:
+            HeroRegistry._set_heroes(heroes, fetched_at)
+            HeroRegistry._loaded = True
+        HeroRegistry._write_snapshot(heroes, fetched_at)
+        logging.debug(f"Hero registry refreshed with {len(heroes)} heroes.")
+        return True
+
+    @staticmethod
+    def refresh_in_background():
+        """Starts a refresh unless one is running or the last one started less than
+        HERO_REFRESH_MIN_INTERVAL ago"""
+        with HeroRegistry._lock:
+            if HeroRegistry._refresh_thread is not None:
+                return
+            last_started_at = HeroRegistry._last_refresh_started_at
+            now = time.monotonic()
+            if (
+                last_started_at is not None
+                and now - last_started_at < HERO_REFRESH_MIN_INTERVAL
+            ):
+                return
+            HeroRegistry._last_refresh_started_at = now
+            HeroRegistry._refresh_thread = threading.Thread(
+                target=HeroRegistry._run_background_refresh,
+                name="hero-registry-refresh",
+                daemon=True,
+            )
+            HeroRegistry._refresh_thread.start()
+
+    @staticmethod
+    def _run_background_refresh():
+        try:
+            HeroRegistry.refresh()
+        finally:
+            with HeroRegistry._lock:
+                HeroRegistry._refresh_thread = None
+
+    @staticmethod
+    def _set_heroes(heroes, fetched_at):
+        hero_names_by_id = [None] * (max(heroes, default=0) + 1)
+        for hero_id, hero_name in heroes.items():
+            hero_names_by_id[hero_id] = hero_name
+        HeroRegistry.hero_names = heroes
+        HeroRegistry.hero_names_by_id = hero_names_by_id
+        HeroRegistry.fetched_at = fetched_at
+
+    @staticmethod
+    def _read_snapshot():
+        snapshot_path = Path(HeroRegistry.snapshot_path)
+        # The schema version is checked by load_state
+        snapshot = load_state(
+            snapshot_path, HERO_SNAPSHOT_VERSION, legacy_path=LEGACY_HERO_SNAPSHOT_PATH
+        )
+        if snapshot is None:
+            return None
+        try:
+            return {
+                "fetched_at": snapshot["fetched_at"],
+                "heroes": {
+                    int(hero_id): hero_name
+                    for hero_id, hero_name in snapshot["heroes"].items()
+                },
+            }
+        except Exception as e:
+            logging.error(f"Hero snapshot {snapshot_path} is invalid, error: {e}.")
+            return None
+
+    @staticmethod
+    def _write_snapshot(heroes, fetched_at):
+        save_state(
+            HeroRegistry.snapshot_path,
+            {"fetched_at": fetched_at, "heroes": heroes},
+            HERO_SNAPSHOT_VERSION,
+        )
@@ -0,0 +1,166 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_HISTORY_STORE_PATH = Path("match_histories", "history.sqlite")
+
+HISTORY = "history"
+RECENT_MATCHES = "recent_matches"
+
+
+def serialize_match(match):
+    return json.dumps(match, sort_keys=True, separators=(",", ":"))
+
+
+def get_match_diff(old_match, new_match):
+    """Maps every changed key to its [old, new] value pair"""
+    if old_match is None:
+        return {key: [None, value] for key, value in new_match.items()}
+    diff = {}
+    for key in old_match.keys() | new_match.keys():
+        if old_match.get(key) != new_match.get(key):
+            diff[key] = [old_match.get(key), new_match.get(key)]
+    return diff
+
+
+class MatchHistoryStore:
+    """SQLite store of player match histories and recentMatches snapshots.
+    Rows are upserted only when they change and every change is recorded in match_changes."""
+
+    def __init__(self, path=DEFAULT_HISTORY_STORE_PATH):
+        self.path = Path(path)
+        self._connection = None
+        self._lock = threading.Lock()
+        # (kind, player_id) -> {match_id: serialized match} of what is on disk
+        self._snapshots = {}
+
+    def _connect(self):
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            with self._connection:
+                for table in (HISTORY, RECENT_MATCHES):
+                    self._connection.execute(
+                        f"CREATE TABLE IF NOT EXISTS {table} ("
+                        "player_id INTEGER NOT NULL, match_id INTEGER NOT NULL, "
+                        "start_time INTEGER NOT NULL, data TEXT NOT NULL, "
+                        "PRIMARY KEY (player_id, match_id))"
+                    )
+                    self._connection.execute(
+                        f"CREATE INDEX IF NOT EXISTS {table}_player_start_time "
+                        f"ON {table} (player_id, start_time)"
+                    )
+                    self._connection.execute(
+                        f"CREATE INDEX IF NOT EXISTS {table}_match_id ON {table} (match_id)"
+                    )
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS match_changes ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+                    "player_id INTEGER NOT NULL, match_id INTEGER NOT NULL, "
+                    "changed_at REAL NOT NULL, diff TEXT NOT NULL)"
+                )
+        return self._connection
+
+    def _get_snapshot(self, kind, player_id):
+        snapshot = self._snapshots.get((kind, player_id))
+        if snapshot is None:
+            rows = self._connect().execute(
+                f"SELECT match_id, data FROM {kind} WHERE player_id = ?", (player_id,)
+            )
+            snapshot = dict(rows.fetchall())
+            self._snapshots[(kind, player_id)] = snapshot
+        return snapshot
+
+    def _load(self, kind, player_id):
+        with self._lock:
+            rows = (
+                self._connect()
+                .execute(
+                    f"SELECT match_id, data FROM {kind} WHERE player_id = ? "
+                    "ORDER BY start_time DESC, match_id DESC",
+                    (player_id,),
+                )
+                .fetchall()
+            )
+            self._snapshots[(kind, player_id)] = dict(rows)
+        return [json.loads(data) for _, data in rows]
+
+    def _upsert(self, kind, player_id, matches):
+        now = time.time()
+        with self._lock:
+            snapshot = self._get_snapshot(kind, player_id)
+            changed_rows = []
+            changes = []
+            for match in matches:
+                data = serialize_match(match)
+                old_data = snapshot.get(match["match_id"])
+                if old_data == data:
+                    continue
+                old_match = json.loads(old_data) if old_data is not None else None
+                changed_rows.append(
+                    (player_id, match["match_id"], match["start_time"], data)
+                )
+                changes.append(
+                    (
+                        kind,
+                        player_id,
+                        match["match_id"],
+                        now,
+                        json.dumps(get_match_diff(old_match, match)),
+                    )
+                )
+            if not changed_rows:
+                return 0
+
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO {kind} (player_id, match_id, start_time, data) "
+                    "VALUES (?, ?, ?, ?)",
+                    changed_rows,
+                )
+                connection.executemany(
+                    "INSERT INTO match_changes (kind, player_id, match_id, changed_at, diff) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    changes,
+                )
+            for _, match_id, _, data in changed_rows:
+                snapshot[match_id] = data
+        logging.debug(
+            f"Stored {len(changed_rows)} changed {kind} rows for player ID {player_id}."
+        )
+        return len(changed_rows)
+
+    def load_history(self, player_id):
+        """Returns the stored match history of the player, newest first"""
+        return self._load(HISTORY, player_id)
+
+    def upsert_history(self, player_id, match_history):
+        """Writes only new or changed matches, returns their count"""
+        return self._upsert(HISTORY, player_id, match_history)
+
+    def load_recent_matches(self, player_id):
+        return self._load(RECENT_MATCHES, player_id)
+
+    def upsert_recent_matches(self, player_id, recent_matches):
+        return self._upsert(RECENT_MATCHES, player_id, recent_matches)
+
+    def get_changes(self, player_id, kind=HISTORY, since=0):
+        with self._lock:
+            rows = (
+                self._connect()
+                .execute(
+                    "SELECT match_id, changed_at, diff FROM match_changes "
+                    "WHERE kind = ? AND player_id = ? AND changed_at >= ? ORDER BY id",
+                    (kind, player_id, since),
+                )
+                .fetchall()
+            )
+        return [
+            {"match_id": match_id, "changed_at": changed_at, "diff": json.loads(diff)}
+            for match_id, changed_at, diff in rows
+        ]
@@ -0,0 +1,102 @@
+import codecs
+import json
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+DELIMITERS = (",", "]", " ", "\t", "\n", "\r", "")
+
+
+class _ArrayParser:
+    """Incremental parser of a top level JSON array, fed with decoded text"""
+
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.started = False
+        self.finished = False
+        # An element has to come next, after the opening bracket or a comma
+        self.expects_element = True
+        self.element_count = 0
+
+    def feed(self, text, final=False):
+        """Yields every element completed by the text, keeps the unfinished rest buffered"""
+        if self.finished:
+            self._check_trailing(text)
+            return
+        buffer = self.buffer + text
+        position = 0
+        length = len(buffer)
+        while True:
+            while position < length and buffer[position] in WHITESPACE:
+                position += 1
+            if position >= length:
+                break
+            char = buffer[position]
+            if not self.started:
+                if char != "[":
+                    raise ValueError(f"Expected a JSON array, found {char!r}.")
+                self.started = True
+                position += 1
+                continue
+            if char == ",":
+                if self.expects_element:
+                    raise ValueError(f"Unexpected comma at position {position}.")
+                self.expects_element = True
+                position += 1
+                continue
+            if char == "]":
+                if self.expects_element and self.element_count:
+                    raise ValueError(f"Trailing comma at position {position}.")
+                self.finished = True
+                self.buffer = ""
+                self._check_trailing(buffer[position + 1 :])
+                return
+            if not self.expects_element:
+                raise ValueError(f"Expected a comma at position {position}.")
+            try:
+                element, end = self.decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                # Element continues in the next chunk
+                break
+            if not isinstance(element, (dict, list)) and (
+                buffer[end : end + 1] not in DELIMITERS or (end == length and not final)
+            ):
+                # A number cut by the chunk end may parse as a shorter one, e.g. 1.5 of 1.5e10
+                if final:
+                    raise ValueError(f"Invalid JSON value at position {position}.")
+                break
+            self.expects_element = False
+            self.element_count += 1
+            yield element
+            position = end
+        self.buffer = buffer[position:]
+
+    @staticmethod
+    def _check_trailing(text):
+        if text.strip(WHITESPACE):
+            raise ValueError("Unexpected data after the JSON array.")
+
+
+def iter_json_array(chunks):
+    """Yields elements of a JSON array from an iterable of byte chunks, one element at a time.
+    Only the unfinished element is buffered, the whole list is never built.
+    The chunks are read to the end, so a streamed response is complete once this returns."""
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = _ArrayParser()
+    for chunk in chunks:
+        yield from parser.feed(text_decoder.decode(chunk))
+    yield from parser.feed(text_decoder.decode(b"", final=True), final=True)
+    if not parser.finished:
+        raise ValueError("JSON array is truncated.")
+
+
+def iter_rows(chunks, fields):
+    """Yields a tuple of the given fields for every object in a JSON array, missing fields are None"""
+    for element in iter_json_array(chunks):
+        yield tuple(element.get(field) for field in fields)
+
+
+def iter_response_rows(response, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    return iter_rows(response.iter_content(chunk_size), fields)
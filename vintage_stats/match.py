@@ -0,0 +1,72 @@
+from datetime import datetime
+
+# Fields kept from OpenDota match lists, streamed rows are tuples in this order
+MATCH_FIELDS = (
+    "match_id",
+    "start_time",
+    "hero_id",
+    "player_slot",
+    "radiant_win",
+    "party_size",
+    "lobby_type",
+    "kills",
+    "deaths",
+    "assists",
+    "duration",
+    "game_mode",
+    "version",
+)
+
+
+def is_victory(radiant_win, player_slot):
+    return bool(radiant_win) != (int(player_slot) > 127)
+
+
+class Match:
+    """Compact record of a player's match, only the fields reports and the monitor use.
+    won, is_party and start_dt are decoded once when the record is built."""
+
+    __slots__ = MATCH_FIELDS + ("won", "is_party", "start_dt")
+
+    def __init__(
+        self,
+        match_id,
+        start_time,
+        hero_id,
+        player_slot,
+        radiant_win,
+        party_size=None,
+        lobby_type=None,
+        kills=None,
+        deaths=None,
+        assists=None,
+        duration=None,
+        game_mode=None,
+        version=None,
+    ):
+        self.match_id = int(match_id)
+        self.start_time = int(start_time)
+        self.hero_id = hero_id
+        self.player_slot = player_slot
+        self.radiant_win = radiant_win
+        self.party_size = party_size
+        self.lobby_type = lobby_type
+        self.kills = kills
+        self.deaths = deaths
+        self.assists = assists
+        self.duration = duration
+        self.game_mode = game_mode
+        self.version = version
+        self.won = is_victory(radiant_win, player_slot)
+        self.is_party = (party_size or 0) > 1
+        self.start_dt = datetime.fromtimestamp(self.start_time)
+
+    @staticmethod
+    def from_dict(match_data):
+        return Match(*(match_data.get(field) for field in MATCH_FIELDS))
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in MATCH_FIELDS}
+
+    def __repr__(self):
+        return f"<Match {self.match_id} {'won' if self.won else 'lost'} {self.start_dt:%d-%b-%Y}>"
@@ -0,0 +1,173 @@
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from vintage_stats.cache import CacheHandler, OpenDotaError, freeze
+from vintage_stats.match_store import MatchStore
+from vintage_stats.serialization import dumps_json, loads_json
+from vintage_stats.utility import get_days_since_date
+
+DEFAULT_MATCH_DETAILS_PATH = Path(".", "data", "match_details.sqlite")
+# Pretty-printed files of the previous format, imported into the store when first read
+LEGACY_MATCHES_PATH = Path(".", "data", "matches")
+MATCH_DETAILS_URL = "https://api.opendota.com/api/matches/{}"
+
+
+class MatchDetailStore:
+    """Durable store of /matches/{id} details shared by all players, so a party game is fetched once.
+    Bodies are kept zlib compressed in SQLite, the table is the index by match ID and start time."""
+
+    def __init__(self, path=DEFAULT_MATCH_DETAILS_PATH):
+        self.path = Path(path)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS match_details ("
+                    "match_id INTEGER PRIMARY KEY, start_time INTEGER, "
+                    "parsed INTEGER NOT NULL, body BLOB NOT NULL, fetched_at REAL NOT NULL)"
+                )
+                self._connection.execute(
+                    "CREATE INDEX IF NOT EXISTS match_details_start_time "
+                    "ON match_details (start_time)"
+                )
+        return self._connection
+
+    def __contains__(self, match_id):
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT 1 FROM match_details WHERE match_id = ?", (int(match_id),)
+                )
+                .fetchone()
+            )
+        return row is not None
+
+    def get(self, match_id):
+        """Stored details of the match, None if they were never fetched"""
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT body FROM match_details WHERE match_id = ?",
+                    (int(match_id),),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return self._import_legacy_file(match_id)
+        return freeze(loads_json(zlib.decompress(row[0])))
+
+    def put(self, match_id, content):
+        """Stores the raw JSON body of the match details"""
+        data = loads_json(content)
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO match_details "
+                    "(match_id, start_time, parsed, body, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        int(match_id),
+                        data.get("start_time"),
+                        int(data.get("version") is not None),
+                        zlib.compress(content),
+                        time.time(),
+                    ),
+                )
+        return freeze(data)
+
+    def get_missing(self, match_ids, include_unparsed=False):
+        """Match IDs without stored details, each listed once in the given order"""
+        match_ids = list(dict.fromkeys(int(match_id) for match_id in match_ids))
+        query = "SELECT match_id FROM match_details WHERE match_id = ?"
+        if include_unparsed:
+            query += " AND parsed = 1"
+        with self._lock:
+            connection = self._connect()
+            return [
+                match_id
+                for match_id in match_ids
+                if connection.execute(query, (match_id,)).fetchone() is None
+                and not self._get_legacy_path(match_id).is_file()
+            ]
+
+    def fetch(self, match_id):
+        """Stored details, fetched from OpenDota and stored if missing"""
+        data = self.get(match_id)
+        if data is None:
+            data = self._download(match_id)
+        return data
+
+    def prefetch(self, match_ids, include_unparsed=False):
+        """Fetches all missing details concurrently, the shared rate limiter paces the calls.
+        include_unparsed also refetches matches stored before OpenDota parsed them.
+        Returns the count of matches fetched."""
+        missing_match_ids = self.get_missing(match_ids, include_unparsed)
+        if not missing_match_ids:
+            return 0
+        logging.info(f"Fetching details of {len(missing_match_ids)} matches.")
+
+        def download(match_id):
+            try:
+                return self._download(match_id) is not None
+            except OpenDotaError as e:
+                logging.error(f"Could not get details of match {match_id}, error: {e}.")
+                return False
+
+        return sum(CacheHandler.fetch_for_players(missing_match_ids, download))
+
+    def prefetch_players(
+        self, players_list, _cutoff_date_from, _cutoff_date_to=None, lobby_type=None
+    ):
+        """Fetches details of every match the players played in the date range,
+        games shared by several players are fetched once"""
+        days = get_days_since_date(_cutoff_date_from)
+        players_list = list(players_list)
+        MatchStore.prefetch(players_list, days)
+        match_ids = []
+        for player in players_list:
+            match_ids.extend(
+                match.match_id
+                for match in MatchStore.get_matches(
+                    player.player_id,
+                    days,
+                    lobby_type=lobby_type,
+                    _cutoff_date_from=_cutoff_date_from,
+                    _cutoff_date_to=_cutoff_date_to,
+                )
+            )
+        return self.prefetch(match_ids)
+
+    def _download(self, match_id):
+        response = CacheHandler.opendota_request_get(MATCH_DETAILS_URL.format(match_id))
+        if not response:
+            logging.error(
+                f"Could not get details of match {match_id}, status {response.status_code}."
+            )
+            return None
+        return self.put(match_id, response.content)
+
+    @staticmethod
+    def _get_legacy_path(match_id):
+        return Path(LEGACY_MATCHES_PATH, f"{match_id}_data.json")
+
+    def _import_legacy_file(self, match_id):
+        legacy_path = self._get_legacy_path(match_id)
+        if not legacy_path.is_file():
+            return None
+        logging.debug(f"Importing details of match {match_id} from {legacy_path}.")
+        # Stored compact, the indentation of the old files is dropped
+        data = self.put(match_id, dumps_json(loads_json(legacy_path.read_bytes())))
+        legacy_path.unlink()
+        return data
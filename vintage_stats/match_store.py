@@ -0,0 +1,153 @@
+import logging
+import time
+from operator import attrgetter
+
+from vintage_stats.cache import CacheHandler, OpenDotaError
+from vintage_stats.json_stream import iter_response_rows
+from vintage_stats.match import MATCH_FIELDS, Match
+from vintage_stats.match_table import MatchTable
+from vintage_stats.range_index import MatchRangeIndex
+
+
+class MatchStore:
+    """Holds each player's match list fetched once per run, narrower date and lobby filters are served locally.
+    Matches are kept as compact Match records, streamed from the response body.
+    Lists are kept by (player ID, significant), significant lists are OpenDota's default
+    that leaves out abandoned and other non-standard games, ranked reports use those."""
+
+    player_matches = {}
+    # Widest window announced up front, so the first fetch already covers every report
+    requested_days = 0
+
+    @staticmethod
+    def request_window(days):
+        MatchStore.requested_days = max(MatchStore.requested_days, int(days))
+
+    @staticmethod
+    def get_matches(
+        player_id,
+        days,
+        lobby_type=None,
+        _cutoff_date_from=None,
+        _cutoff_date_to=None,
+        significant=False,
+    ):
+        """Returns Match records of the last `days` days, newest first, same as /players/{id}/matches?date=days"""
+        stored = MatchStore.load(player_id, days, significant)
+
+        oldest_start_time = time.time() - days * 86400
+        cutoff_from = _cutoff_date_from.timestamp() if _cutoff_date_from else None
+        cutoff_to = _cutoff_date_to.timestamp() if _cutoff_date_to else None
+
+        filtered_matches = []
+        for match in stored["matches"]:
+            start_time = match.start_time
+            if start_time < oldest_start_time:
+                # Matches are ordered from the newest, nothing older can match
+                break
+            if cutoff_to is not None and start_time > cutoff_to:
+                continue
+            if cutoff_from is not None and start_time < cutoff_from:
+                break
+            if lobby_type is not None and match.lobby_type != lobby_type:
+                continue
+            filtered_matches.append(match)
+        return filtered_matches
+
+    @staticmethod
+    def get_table(player_id, days, significant=False):
+        """Columnar MatchTable over the stored matches, built once per fetched list"""
+        stored = MatchStore.load(player_id, days, significant)
+        if stored.get("table") is None:
+            stored["table"] = MatchTable(stored["matches"])
+        return stored["table"]
+
+    @staticmethod
+    def get_range_index(player_id, days, lobby_type=None, significant=False):
+        """MatchRangeIndex over the stored matches of the lobby type, all lobbies if None.
+        Built once per fetched list and kept up to date by add_matches."""
+        stored = MatchStore.load(player_id, days, significant)
+        range_indexes = stored.setdefault("range_indexes", {})
+        range_index = range_indexes.get(lobby_type)
+        if range_index is None:
+            range_index = range_indexes[lobby_type] = MatchRangeIndex(
+                match
+                for match in stored["matches"]
+                if lobby_type is None or match.lobby_type == lobby_type
+            )
+        return range_index
+
+    @staticmethod
+    def add_matches(player_id, matches):
+        """Adds newly played Match records to a stored list, returns how many were new.
+        Players with nothing stored yet are skipped, their first fetch includes the matches."""
+        # recentMatches does not tell which games are significant, that list is fetched again
+        MatchStore.player_matches.pop((player_id, True), None)
+        stored = MatchStore.player_matches.get((player_id, False))
+        if stored is None:
+            return 0
+        known_match_ids = {match.match_id for match in stored["matches"]}
+        new_matches = [
+            match for match in matches if match.match_id not in known_match_ids
+        ]
+        if not new_matches:
+            return 0
+        stored["matches"] = sorted(
+            new_matches + stored["matches"], key=attrgetter("start_time"), reverse=True
+        )
+        stored["table"] = None
+        for lobby_type, range_index in stored.get("range_indexes", {}).items():
+            for match in new_matches:
+                if lobby_type is None or match.lobby_type == lobby_type:
+                    range_index.add(match)
+        logging.debug(f"Added {len(new_matches)} new matches of player ID {player_id}.")
+        return len(new_matches)
+
+    @staticmethod
+    def load(player_id, days, significant=False):
+        """Makes sure the stored matches cover the last `days` days, fetching them if not"""
+        stored = MatchStore.player_matches.get((player_id, significant))
+        if stored is None or stored["days"] < days:
+            stored = MatchStore._fetch(
+                player_id, max(days, MatchStore.requested_days), significant
+            )
+        return stored
+
+    @staticmethod
+    def prefetch(players_list, days, significant=False):
+        """Fetches the match lists of all players concurrently, so reports walking the pool do not wait on each"""
+        CacheHandler.fetch_for_players(
+            players_list,
+            lambda player: MatchStore.load(player.player_id, days, significant),
+        )
+
+    @staticmethod
+    def _fetch(player_id, days, significant=False):
+        # OpenDota lists only significant matches unless asked otherwise
+        significant_query = "" if significant else "significant=0&"
+        response_str = f"https://api.opendota.com/api/players/{player_id}/matches?{significant_query}date={days}"
+        # The records are the only copy kept, the raw body is only cached on disk
+        matches_response = CacheHandler.streamed_opendota_request_get(response_str)
+        if not matches_response:
+            # Reports built without this player's matches would be silently wrong
+            raise OpenDotaError(
+                f"Could not get matches for player ID {player_id}, window {days} days, "
+                f"status {matches_response.status_code}."
+            )
+
+        matches = sorted(
+            (Match(*row) for row in iter_response_rows(matches_response, MATCH_FIELDS)),
+            key=attrgetter("start_time"),
+            reverse=True,
+        )
+        stored = {"days": days, "matches": matches}
+        MatchStore.player_matches[(player_id, significant)] = stored
+        logging.debug(
+            f"Stored {len(matches)} matches of player ID {player_id}, window {days} days, "
+            f"significant {significant}."
+        )
+        return stored
+
+    @staticmethod
+    def clear():
+        MatchStore.player_matches = {}
@@ -0,0 +1,71 @@
+from array import array
+
+
+class MatchTable:
+    """Column oriented copy of a player's Match records.
+    Built once per list, stack and MMR reports select rows with masks instead of branching per match."""
+
+    def __init__(self, matches):
+        self.match_id = array("q")
+        self.start_time = array("q")
+        self.hero_id = array("h")
+        self.player_slot = array("h")
+        self.radiant_win = array("b")
+        self.party_size = array("b")
+        self.lobby_type = array("b")
+        self.kills = array("h")
+        self.deaths = array("h")
+        self.assists = array("h")
+        self.duration = array("l")
+        self.won = array("b")
+        self.is_party = array("b")
+
+        for match in matches:
+            self.match_id.append(match.match_id)
+            self.start_time.append(match.start_time)
+            self.hero_id.append(int(match.hero_id or 0))
+            self.player_slot.append(int(match.player_slot))
+            self.radiant_win.append(bool(match.radiant_win))
+            self.party_size.append(int(match.party_size or 0))
+            lobby_type = match.lobby_type
+            self.lobby_type.append(-1 if lobby_type is None else int(lobby_type))
+            self.kills.append(int(match.kills or 0))
+            self.deaths.append(int(match.deaths or 0))
+            self.assists.append(int(match.assists or 0))
+            self.duration.append(int(match.duration or 0))
+            # Decoded once in the record
+            self.won.append(match.won)
+            self.is_party.append(match.is_party)
+
+    def __len__(self):
+        return len(self.match_id)
+
+    def get_mask(self, lobby_type=None, _cutoff_date_from=None, _cutoff_date_to=None):
+        mask = array("b", [1]) * len(self)
+        if _cutoff_date_from is not None:
+            cutoff_from = _cutoff_date_from.timestamp()
+            mask = array(
+                "b",
+                (
+                    selected and start_time >= cutoff_from
+                    for selected, start_time in zip(mask, self.start_time)
+                ),
+            )
+        if _cutoff_date_to is not None:
+            cutoff_to = _cutoff_date_to.timestamp()
+            mask = array(
+                "b",
+                (
+                    selected and start_time <= cutoff_to
+                    for selected, start_time in zip(mask, self.start_time)
+                ),
+            )
+        if lobby_type is not None:
+            mask = array(
+                "b",
+                (
+                    selected and match_lobby_type == lobby_type
+                    for selected, match_lobby_type in zip(mask, self.lobby_type)
+                ),
+            )
+        return mask
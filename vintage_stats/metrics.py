@@ -0,0 +1,269 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+DEFAULT_METRICS_LOG_PATH = Path(".", "data", "request_metrics.jsonl")
+METRICS_PREFIX = "vintage_stats"
+
+# Where the response came from, network requests are the only ones counted against the quota
+CACHE_MEMORY = "memory"
+CACHE_PERSISTENT = "persistent"
+CACHE_COALESCED = "coalesced"
+CACHE_MISS = "miss"
+CACHE_BYPASS = "bypass"
+# Not sent at all, the circuit breaker was open
+CACHE_REJECTED = "rejected"
+
+
+def get_endpoint(url):
+    """Path of the URL with numeric IDs replaced, e.g. /api/players/{id}/recentMatches"""
+    return re.sub(r"/\d+(?=/|$)", "/{id}", urlsplit(url).path.rstrip("/"))
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestMetrics:
+    """Per-request metrics of CacheHandler, appended to a JSON-lines log and aggregated for export.
+    Every record has endpoint, latency, bytes, status, cache source and retry count."""
+
+    def __init__(self, log_path=DEFAULT_METRICS_LOG_PATH):
+        # Set log_path to None to keep the aggregates only
+        self.log_path = Path(log_path) if log_path is not None else None
+        self.started_at = time.time()
+        # (method, endpoint, cache, status) -> [count, latency sum, bytes sum, retries sum]
+        self.totals = {}
+        self.network_times = deque()
+        self.last_cycle = None
+        self._log_file = None
+        self._lock = threading.Lock()
+
+    def record(self, method, url, cache, status=None, latency=0.0, size=0, retries=0):
+        endpoint = get_endpoint(url)
+        now = time.time()
+        entry = {
+            "time": round(now, 3),
+            "method": method,
+            "endpoint": endpoint,
+            "url": url,
+            "status": status,
+            "cache": cache,
+            "latency": round(latency, 4),
+            "bytes": size,
+            "retries": retries,
+        }
+        with self._lock:
+            key = (method, endpoint, cache, status)
+            totals = self.totals.setdefault(key, [0, 0.0, 0, 0])
+            totals[0] += 1
+            totals[1] += latency
+            totals[2] += size
+            totals[3] += retries
+            if cache in (CACHE_MISS, CACHE_BYPASS):
+                self.network_times.append(now)
+            self._write(entry)
+        logging.debug(
+            f"{method} {endpoint} {status} from {cache} in {latency:.3f} s, {size} bytes."
+        )
+
+    def record_cycle(self, duration, players_count, new_matches_count):
+        with self._lock:
+            self.last_cycle = {
+                "time": round(time.time(), 3),
+                "duration": round(duration, 4),
+                "players": players_count,
+                "new_matches": new_matches_count,
+            }
+            self._write(dict(self.last_cycle, event="monitor_cycle"))
+
+    def _write(self, entry):
+        if self.log_path is None:
+            return
+        try:
+            if self._log_file is None:
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                self._log_file = self.log_path.open(mode="a", buffering=1)
+            self._log_file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        except OSError as e:
+            logging.error(
+                f"Could not write request metrics to {self.log_path}, error: {e}."
+            )
+            self.log_path = None
+
+    def get_network_count(self, window=None):
+        """Requests sent to OpenDota this run, or in the last window seconds"""
+        with self._lock:
+            if window is None:
+                return sum(
+                    totals[0]
+                    for (_, _, cache, _), totals in self.totals.items()
+                    if cache in (CACHE_MISS, CACHE_BYPASS)
+                )
+            cutoff = time.time() - window
+            while self.network_times and self.network_times[0] < cutoff:
+                self.network_times.popleft()
+            return len(self.network_times)
+
+    def get_summary(self):
+        """Request count, total latency and bytes by endpoint and cache source"""
+        summary = {}
+        with self._lock:
+            for (method, endpoint, cache, _), totals in self.totals.items():
+                endpoint_summary = summary.setdefault(f"{method} {endpoint}", {})
+                cache_summary = endpoint_summary.setdefault(
+                    cache, {"count": 0, "latency": 0.0, "bytes": 0, "retries": 0}
+                )
+                cache_summary["count"] += totals[0]
+                cache_summary["latency"] += totals[1]
+                cache_summary["bytes"] += totals[2]
+                cache_summary["retries"] += totals[3]
+        return summary
+
+    def render_prometheus(self, rate_limiter=None):
+        network_last_minute = self.get_network_count(window=60)
+        lines = []
+
+        def add_metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {METRICS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} {metric_type}")
+            for labels, value in samples:
+                label_string = ",".join(
+                    f'{label}="{escape_label(label_value)}"'
+                    for label, label_value in labels
+                )
+                suffix = f"{{{label_string}}}" if label_string else ""
+                lines.append(f"{METRICS_PREFIX}_{name}{suffix} {value}")
+
+        with self._lock:
+            totals = sorted(self.totals.items(), key=lambda item: str(item[0]))
+            last_cycle = self.last_cycle
+
+        def totals_samples(index):
+            return [
+                (
+                    (
+                        ("method", method),
+                        ("endpoint", endpoint),
+                        ("cache", cache),
+                        ("status", "" if status is None else status),
+                    ),
+                    values[index],
+                )
+                for (method, endpoint, cache, status), values in totals
+            ]
+
+        add_metric(
+            "requests_total",
+            "counter",
+            "Requests by endpoint and cache source.",
+            totals_samples(0),
+        )
+        add_metric(
+            "request_latency_seconds_total",
+            "counter",
+            "Summed request latency.",
+            totals_samples(1),
+        )
+        add_metric(
+            "response_bytes_total",
+            "counter",
+            "Summed response body size.",
+            totals_samples(2),
+        )
+        add_metric(
+            "retries_total", "counter", "Retried request attempts.", totals_samples(3)
+        )
+
+        add_metric(
+            "network_requests_last_minute",
+            "gauge",
+            "Requests sent to OpenDota in the last 60 seconds.",
+            [((), network_last_minute)],
+        )
+        if rate_limiter is not None:
+            add_metric(
+                "rate_limit_per_minute",
+                "gauge",
+                "Configured OpenDota request quota per minute.",
+                [((), round(rate_limiter.rate * 60, 3))],
+            )
+        if last_cycle is not None:
+            add_metric(
+                "monitor_last_cycle_seconds",
+                "gauge",
+                "Duration of the last monitor cycle.",
+                [((), last_cycle["duration"])],
+            )
+            add_metric(
+                "monitor_last_cycle_timestamp",
+                "gauge",
+                "Unix time the last monitor cycle finished.",
+                [((), last_cycle["time"])],
+            )
+        add_metric(
+            "uptime_seconds",
+            "gauge",
+            "Seconds since start.",
+            [((), round(time.time() - self.started_at, 3))],
+        )
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        with self._lock:
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+
+
+class MetricsServer:
+    """Local HTTP endpoint serving request metrics in the Prometheus text format on /metrics"""
+
+    def __init__(self, render_function, port, host="127.0.0.1"):
+        self.render_function = render_function
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        render_function = self.render_function
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_function().encode("utf-8")
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8"
+                )
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Metrics server: {format % args}")
+
+        self._server = ThreadingHTTPServer(
+            (self.host, self.port), MetricsRequestHandler
+        )
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics-server", daemon=True
+        )
+        self._thread.start()
+        logging.info(f"Serving metrics on http://{self.host}:{self.port}/metrics.")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,119 @@
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate, compress
+
+from vintage_stats.match_store import MatchStore
+from vintage_stats.utility import get_days_since_date
+
+RANKED_LOBBY_TYPE = 7
+
+
+def get_mmr_change(player_won, was_party):
+    sign = 1 if player_won else -1
+    return (20 + int((not was_party) * 10)) * sign
+
+
+class MMRTimeline:
+    """Reconstructed MMR of one player after each ranked match, oldest first.
+    Every known anchor is exact, matches between anchors continue from the latest older anchor
+    and matches before the first anchor are counted back from it."""
+
+    def __init__(self, player, match_ids, start_times, won, is_party, anchors):
+        self.player = player
+        self.match_ids = match_ids
+        self.start_times = start_times
+        self.won = won
+        self.is_party = is_party
+        self.changes = array("l", map(get_mmr_change, won, is_party))
+        self.mmr_after = array("l")
+
+        index_by_match_id = {
+            match_id: index for index, match_id in enumerate(match_ids)
+        }
+        anchor_indexes = sorted(
+            (index_by_match_id[match_id], mmr_amount)
+            for match_id, mmr_amount in anchors.items()
+            if match_id in index_by_match_id and mmr_amount is not None
+        )
+        self.anchor_indexes = [index for index, _ in anchor_indexes]
+        if not anchor_indexes:
+            return
+
+        # change_sums[i] is the sum of changes of the first i matches
+        change_sums = array("l", accumulate(self.changes, initial=0))
+        segment_starts = [0] + [index for index, _ in anchor_indexes[1:]]
+        segment_ends = segment_starts[1:] + [len(match_ids)]
+        for (anchor_index, mmr_amount), start, end in zip(
+            anchor_indexes, segment_starts, segment_ends
+        ):
+            offset = mmr_amount - change_sums[anchor_index + 1]
+            self.mmr_after.extend(map(offset.__add__, change_sums[start + 1 : end + 1]))
+
+    def __len__(self):
+        return len(self.match_ids)
+
+    def __bool__(self):
+        return bool(self.mmr_after)
+
+    def get_records(self):
+        """Rows of the MMR history table, oldest first"""
+        records = []
+        for match_id, start_time, won, is_party, change, mmr_after in zip(
+            self.match_ids,
+            self.start_times,
+            self.won,
+            self.is_party,
+            self.changes,
+            self.mmr_after,
+        ):
+            start_dt = datetime.fromtimestamp(start_time)
+            records.append(
+                {
+                    "match_id": match_id,
+                    "mmr_after": mmr_after,
+                    "won": bool(won),
+                    "party": bool(is_party),
+                    "mmr_change": change,
+                    "start_time": start_dt,
+                    "start_time_string": start_dt.strftime("%d-%b-%Y"),
+                }
+            )
+        return records
+
+
+def get_mmr_timeline(player, anchors, _cutoff_date_from=None, _cutoff_date_to=None):
+    """anchors maps match IDs to the known MMR after that match"""
+    cutoff_date_from = _cutoff_date_from or datetime.now() - timedelta(days=2 * 365)
+    cutoff_date_to = _cutoff_date_to or datetime.now()
+    matches_table = MatchStore.get_table(
+        player.player_id, get_days_since_date(cutoff_date_from), significant=True
+    )
+    mask = matches_table.get_mask(
+        lobby_type=RANKED_LOBBY_TYPE,
+        _cutoff_date_from=cutoff_date_from,
+        _cutoff_date_to=cutoff_date_to,
+    )
+    # The table is ordered from the newest match
+    return MMRTimeline(
+        player,
+        array("q", reversed(list(compress(matches_table.match_id, mask)))),
+        array("q", reversed(list(compress(matches_table.start_time, mask)))),
+        array("b", reversed(list(compress(matches_table.won, mask)))),
+        array("b", reversed(list(compress(matches_table.is_party, mask)))),
+        anchors,
+    )
+
+
+def get_pool_mmr_timelines(players_list, _cutoff_date_from=None, _cutoff_date_to=None):
+    """MMR timelines of every player with a known MMR point, their matches are fetched concurrently"""
+    cutoff_date_from = _cutoff_date_from or datetime.now() - timedelta(days=2 * 365)
+    players_list = [player for player in players_list if player.known_mmr_points]
+    MatchStore.prefetch(
+        players_list, get_days_since_date(cutoff_date_from), significant=True
+    )
+    return {
+        player.player_id: get_mmr_timeline(
+            player, player.known_mmr_points, cutoff_date_from, _cutoff_date_to
+        )
+        for player in players_list
+    }
@@ -0,0 +1,367 @@
+import heapq
+import logging
+import time
+from pathlib import Path
+
+from vintage_stats.cache import CacheHandler, OpenDotaError
+from vintage_stats.match import Match
+from vintage_stats.match_store import MatchStore
+from vintage_stats.data_processing import (
+    flush_parse_requests,
+    get_match_history_difference,
+    get_player_match_history,
+    handle_recent_matches_file,
+    parse_request_queue,
+    update_player_match_history,
+)
+from vintage_stats.parse_queue import DONE, REQUESTED
+from vintage_stats.serialization import STATE_SUFFIX, load_state, save_state
+
+# Seconds between polls of a player who just finished a game
+ACTIVE_POLL_INTERVAL = 5 * 60
+# Seconds between polls of a player with no new game, doubled after every idle poll
+IDLE_POLL_INTERVAL = 10 * 60
+MAX_POLL_INTERVAL = 60 * 60
+# Players whose newest match did not change still get a full recentMatches fetch this often
+FULL_FETCH_INTERVAL = 60 * 60
+DEFAULT_PROBE_STATE_PATH = Path(".", "data", f"monitor_probe{STATE_SUFFIX}")
+PROBE_STATE_SCHEMA_VERSION = 1
+
+
+def get_recent_matches(player):
+    response_str = (
+        f"https://api.opendota.com/api/players/{player.player_id}/recentMatches"
+    )
+    try:
+        response = CacheHandler.opendota_request_get(response_str)
+        if not response:
+            # Error bodies such as {"error": ...} are not match lists
+            logging.error(
+                f"Could not get recentMatches for player {player.nick}, skipping in this cycle, "
+                f"status {response.status_code}."
+            )
+            return None
+        return response.json()
+    except Exception as e:
+        logging.error(
+            f"Could not get recentMatches for player {player.nick}, skipping in this cycle, error: {e}."
+        )
+        return None
+
+
+def get_newest_match_id(player):
+    """Newest match ID of the player from a one-row match list, None if the probe failed"""
+    response_str = f"https://api.opendota.com/api/players/{player.player_id}/matches?significant=0&limit=1"
+    try:
+        response = CacheHandler.opendota_request_get(response_str)
+    except OpenDotaError as e:
+        logging.error(f"Probe of player {player.nick} failed, error: {e}.")
+        return None
+    if not response:
+        logging.error(
+            f"Probe of player {player.nick} failed, status {response.status_code}."
+        )
+        return None
+    matches = response.json()
+    return matches[0]["match_id"] if matches else None
+
+
+class ChangeProbe:
+    """Skips the recentMatches download and history merge of players with no new match.
+    The newest match ID is checked with a one-row request first. A full fetch still happens
+    when a parse of an unparsed recent match finished, or after FULL_FETCH_INTERVAL.
+    State is kept between runs, so one-shot monitor cycles are probed too."""
+
+    def __init__(
+        self, path=DEFAULT_PROBE_STATE_PATH, full_fetch_interval=FULL_FETCH_INTERVAL
+    ):
+        self.path = Path(path)
+        self.full_fetch_interval = full_fetch_interval
+        self._heads = None
+
+    @property
+    def heads(self):
+        """Player ID as string to newest match ID, time of the full fetch and unparsed match IDs"""
+        if self._heads is None:
+            self._heads = load_state(self.path, PROBE_STATE_SCHEMA_VERSION) or {}
+        return self._heads
+
+    def needs_fetch(self, player):
+        head = self.heads.get(str(player.player_id))
+        if head is None or time.time() - head["fetched_at"] >= self.full_fetch_interval:
+            return True
+        for match_id in head["unparsed"]:
+            parse_status = parse_request_queue.get_status(match_id)
+            if parse_status is not None and parse_status["status"] == DONE:
+                logging.debug(
+                    f"Parse of match {match_id} finished, fetching {player.nick}."
+                )
+                return True
+
+        newest_match_id = get_newest_match_id(player)
+        if newest_match_id is None or newest_match_id != head["match_id"]:
+            return True
+        logging.debug(f"No new match of player {player.nick}, skipped.")
+        return False
+
+    def record_fetch(self, player, recent_matches):
+        # Finished parses that left a match unparsed are not waited for again.
+        # The history merge marks the rows it queued for parsing as "requested", those are unparsed too.
+        unparsed_match_ids = []
+        for match in recent_matches:
+            if match.get("version") and match["version"] != REQUESTED:
+                continue
+            parse_status = parse_request_queue.get_status(match["match_id"])
+            if parse_status is None or parse_status["status"] != DONE:
+                unparsed_match_ids.append(match["match_id"])
+        self.heads[str(player.player_id)] = {
+            "match_id": recent_matches[0]["match_id"],
+            "fetched_at": time.time(),
+            "unparsed": unparsed_match_ids,
+        }
+
+    def save(self):
+        if self._heads is not None:
+            save_state(self.path, self._heads, PROBE_STATE_SCHEMA_VERSION)
+
+
+def process_recent_matches(
+    player, recent_matches, match_id_to_match_listing, match_histories
+):
+    """Stores recentMatches of the player and merges them into the player's history.
+    Histories are kept in match_histories between calls. Returns the count of new matches, None if skipped."""
+    logging.info(
+        f"\n-----------------------------------------------------------------------\n"
+        f"Processing recentMatches for player {player.nick}."
+    )
+    if recent_matches is None:
+        return None
+
+    if not recent_matches:
+        logging.error(
+            f"Could not get recentMatches for player {player.nick}, skipping in this cycle, recent_matches empty."
+        )
+        return None
+
+    handle_recent_matches_file(recent_matches, player)
+    logging.info(
+        f"Finished getting recentMatches, length: {len(recent_matches)} for player {player.nick}."
+    )
+
+    match_history = match_histories.get(player.player_id)
+    if not match_history:
+        logging.info(f"Getting matchHistory for player {player.nick}.")
+        match_history = get_player_match_history(player)
+        logging.debug(len(match_history))
+        logging.debug(match_history)
+
+        if len(match_history) == 0:
+            logging.info(f"Match history empty for player {player.nick}, skipping.")
+            return None
+        match_histories[player.player_id] = match_history
+        logging.info(
+            f"Finished getting matchHistory for player {player.nick}, length: {len(match_history)}."
+        )
+
+    match_id_to_match_listing, common_history_point = get_match_history_difference(
+        player, recent_matches, match_history, match_id_to_match_listing
+    )
+    if common_history_point is None:
+        return None
+    if common_history_point:
+        # Keeps reports generated by this process current without refetching
+        MatchStore.add_matches(
+            player.player_id,
+            [Match.from_dict(match) for match in match_history[:common_history_point]],
+        )
+
+    update_player_match_history(
+        player, recent_matches, match_history, common_history_point
+    )
+    return common_history_point
+
+
+def print_match_listings(match_id_to_match_listing):
+    for match_listing in match_id_to_match_listing.values():
+        players_involved = [player.nick for player in match_listing.players]
+        logging.info(
+            f"\n\n{match_listing.get_common_data().match_id}: {match_listing.is_vintage_party}, "
+            f"players: {players_involved}"
+        )
+        match_listing.print_listing()
+
+
+def poll_players(players_list, match_id_to_match_listing, match_histories, probe=None):
+    """Fetches recentMatches of all players concurrently and processes them in pool order.
+    With a ChangeProbe, players without a new match are skipped and counted as 0 new matches.
+    Returns new match counts by player ID."""
+    players_list = list(players_list)
+    new_match_counts = {}
+    if probe is not None:
+        needs_fetch_flags = CacheHandler.fetch_for_players(
+            players_list, probe.needs_fetch
+        )
+        for player, needs_fetch in zip(players_list, needs_fetch_flags):
+            if not needs_fetch:
+                new_match_counts[player.player_id] = 0
+        players_list = [
+            player
+            for player in players_list
+            if player.player_id not in new_match_counts
+        ]
+
+    all_recent_matches = CacheHandler.fetch_for_players(
+        players_list, get_recent_matches
+    )
+    for player, recent_matches in zip(players_list, all_recent_matches):
+        new_match_count = process_recent_matches(
+            player, recent_matches, match_id_to_match_listing, match_histories
+        )
+        new_match_counts[player.player_id] = new_match_count
+        if probe is not None and new_match_count is not None:
+            probe.record_fetch(player, recent_matches)
+    if probe is not None:
+        probe.save()
+    return new_match_counts
+
+
+def run_monitor_cycle(players_list, match_histories=None, use_probe=True):
+    """Polls every player once and prints their new matches, returns new match counts by player ID"""
+    if match_histories is None:
+        match_histories = {}
+    start = time.perf_counter()
+    match_id_to_match_listing = {}
+    new_match_counts = poll_players(
+        players_list,
+        match_id_to_match_listing,
+        match_histories,
+        ChangeProbe() if use_probe else None,
+    )
+    flush_parse_requests()
+    print_match_listings(match_id_to_match_listing)
+    CacheHandler.metrics.record_cycle(
+        time.perf_counter() - start,
+        len(new_match_counts),
+        sum(count or 0 for count in new_match_counts.values()),
+    )
+    return new_match_counts
+
+
+class MonitorDaemon:
+    """Resident monitor, keeps the player pool and histories in memory between polls.
+    Each player is polled on its own schedule, often right after a new game and backing off while idle."""
+
+    def __init__(
+        self,
+        player_pool,
+        active_interval=ACTIVE_POLL_INTERVAL,
+        idle_interval=IDLE_POLL_INTERVAL,
+        max_interval=MAX_POLL_INTERVAL,
+        use_probe=True,
+    ):
+        self.players = list(player_pool)
+        self.probe = ChangeProbe() if use_probe else None
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.max_interval = max_interval
+        self.match_histories = {}
+        self.poll_intervals = {
+            player.player_id: idle_interval for player in self.players
+        }
+        # Heap of (next poll time, pool index), everyone is polled on start
+        now = time.time()
+        self.schedule = [(now, index) for index in range(len(self.players))]
+        heapq.heapify(self.schedule)
+
+    def get_due_players(self, now):
+        due_indexes = []
+        while self.schedule and self.schedule[0][0] <= now:
+            due_indexes.append(heapq.heappop(self.schedule)[1])
+        return sorted(due_indexes)
+
+    def update_schedule(self, index, new_match_count, now):
+        player = self.players[index]
+        if new_match_count:
+            poll_interval = self.active_interval
+        elif new_match_count is None:
+            # Failed poll, retry on the regular idle interval
+            poll_interval = self.idle_interval
+        else:
+            poll_interval = min(
+                self.poll_intervals[player.player_id] * 2, self.max_interval
+            )
+        self.poll_intervals[player.player_id] = poll_interval
+        heapq.heappush(self.schedule, (now + poll_interval, index))
+        logging.debug(f"Next poll of player {player.nick} in {poll_interval} s.")
+
+    def reschedule_unscheduled(self, now):
+        """Puts players taken off the schedule by a failed poll back on the idle interval"""
+        scheduled_indexes = {index for _, index in self.schedule}
+        for index in range(len(self.players)):
+            if index not in scheduled_indexes:
+                self.update_schedule(index, None, now)
+
+    def poll(self, due_indexes):
+        due_players = [self.players[index] for index in due_indexes]
+        match_id_to_match_listing = {}
+        new_match_counts = poll_players(
+            due_players, match_id_to_match_listing, self.match_histories, self.probe
+        )
+
+        # Party mates of a new party game may not be due yet, poll them now so the game is listed once
+        has_new_party_game = any(
+            match_listing.get_common_data().is_party
+            for match_listing in match_id_to_match_listing.values()
+        )
+        if has_new_party_game and self.schedule:
+            waiting_indexes = sorted(index for _, index in self.schedule)
+            self.schedule = []
+            logging.debug("New party game found, polling all remaining players too.")
+            waiting_players = [self.players[index] for index in waiting_indexes]
+            new_match_counts.update(
+                poll_players(
+                    waiting_players,
+                    match_id_to_match_listing,
+                    self.match_histories,
+                    self.probe,
+                )
+            )
+            due_indexes = due_indexes + waiting_indexes
+
+        flush_parse_requests()
+        print_match_listings(match_id_to_match_listing)
+        return due_indexes, new_match_counts
+
+    def run(self, max_cycles=None):
+        cycle_count = 0
+        try:
+            while max_cycles is None or cycle_count < max_cycles:
+                now = time.time()
+                due_indexes = self.get_due_players(now)
+                if not due_indexes:
+                    time.sleep(max(self.schedule[0][0] - now, 1))
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    polled_indexes, new_match_counts = self.poll(due_indexes)
+                except Exception as e:
+                    # One bad cycle must not stop the daemon
+                    logging.error(f"Monitor daemon cycle failed, error: {e!r}.")
+                    self.reschedule_unscheduled(time.time())
+                    cycle_count += 1
+                    continue
+                CacheHandler.metrics.record_cycle(
+                    time.perf_counter() - start,
+                    len(polled_indexes),
+                    sum(count or 0 for count in new_match_counts.values()),
+                )
+                now = time.time()
+                for index in polled_indexes:
+                    self.update_schedule(
+                        index, new_match_counts[self.players[index].player_id], now
+                    )
+                cycle_count += 1
+                logging.info(f"Monitor daemon cycle {cycle_count} finished.")
+        except KeyboardInterrupt:
+            logging.info("Monitor daemon stopped.")
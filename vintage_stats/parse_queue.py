@@ -0,0 +1,232 @@
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from vintage_stats.cache import CacheHandler, OpenDotaError
+
+DEFAULT_PARSE_QUEUE_PATH = Path(".", "data", "parse_requests.sqlite")
+# A match is not requested more often than this, OpenDota may simply have no replay
+MAX_PARSE_ATTEMPTS = 3
+# Jobs are polled only after this many seconds and at most this many per flush, polls cost quota too
+JOB_POLL_DELAY = 60
+JOB_POLL_LIMIT = 10
+# A job whose polls keep failing is given up, the match can then be requested again
+MAX_JOB_POLL_FAILURES = 3
+
+QUEUED = "queued"
+REQUESTED = "requested"
+DONE = "done"
+FAILED = "failed"
+
+
+class ParseRequestQueue:
+    """Durable queue of match parse requests shared by all players.
+    Matches are deduplicated on enqueue and sent to OpenDota in one batch per cycle by flush."""
+
+    def __init__(self, path=DEFAULT_PARSE_QUEUE_PATH):
+        self.path = Path(path)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS parse_requests ("
+                    "match_id INTEGER PRIMARY KEY, status TEXT NOT NULL, "
+                    "attempts INTEGER NOT NULL DEFAULT 0, job_id INTEGER, "
+                    "queued_at REAL NOT NULL, requested_at REAL, updated_at REAL NOT NULL, "
+                    "poll_failures INTEGER NOT NULL DEFAULT 0)"
+                )
+                columns = {
+                    row[1]
+                    for row in self._connection.execute(
+                        "PRAGMA table_info(parse_requests)"
+                    )
+                }
+                # Queues created before polls were counted
+                if "poll_failures" not in columns:
+                    self._connection.execute(
+                        "ALTER TABLE parse_requests "
+                        "ADD COLUMN poll_failures INTEGER NOT NULL DEFAULT 0"
+                    )
+                self._connection.execute(
+                    "CREATE INDEX IF NOT EXISTS parse_requests_status "
+                    "ON parse_requests (status, requested_at)"
+                )
+        return self._connection
+
+    def enqueue(self, match_id):
+        """Queues the match unless it is already waiting, being parsed or out of attempts.
+        Returns True if the match was queued."""
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                row = connection.execute(
+                    "SELECT status, attempts FROM parse_requests WHERE match_id = ?",
+                    (match_id,),
+                ).fetchone()
+                if row is None:
+                    connection.execute(
+                        "INSERT INTO parse_requests (match_id, status, queued_at, updated_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (match_id, QUEUED, now, now),
+                    )
+                    return True
+                status, attempts = row
+                if status in (QUEUED, REQUESTED) or attempts >= MAX_PARSE_ATTEMPTS:
+                    logging.debug(
+                        f"Parse of match {match_id} not queued, {status} after {attempts} attempts."
+                    )
+                    return False
+                connection.execute(
+                    "UPDATE parse_requests SET status = ?, queued_at = ?, updated_at = ? "
+                    "WHERE match_id = ?",
+                    (QUEUED, now, now, match_id),
+                )
+                return True
+
+    def get_status(self, match_id):
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT status, attempts, job_id FROM parse_requests WHERE match_id = ?",
+                    (match_id,),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        return {"status": row[0], "attempts": row[1], "job_id": row[2]}
+
+    def flush(self):
+        """Sends every queued parse request, then polls jobs that were sent earlier.
+        Returns the count of requests sent."""
+        with self._lock:
+            queued_match_ids = [
+                match_id
+                for (match_id,) in self._connect().execute(
+                    "SELECT match_id FROM parse_requests WHERE status = ? ORDER BY queued_at",
+                    (QUEUED,),
+                )
+            ]
+
+        updates = []
+        for match_id in queued_match_ids:
+            # POSTs go through the shared rate limiter, one at a time
+            try:
+                response = CacheHandler.opendota_request_post(
+                    f"https://api.opendota.com/api/request/{match_id}"
+                )
+            except OpenDotaError as e:
+                logging.error(f"Parse request for match {match_id} failed, error: {e}.")
+                break
+            job_id = None
+            if response.ok:
+                try:
+                    job_id = ((response.json() or {}).get("job") or {}).get("jobId")
+                except (ValueError, AttributeError) as e:
+                    logging.error(
+                        f"Parse request for match {match_id} returned an invalid body, error: {e}."
+                    )
+            logging.debug(
+                f"Parse request for match {match_id} sent, status {response.status_code}, job {job_id}."
+            )
+            now = time.time()
+            updates.append(
+                (REQUESTED if response else FAILED, job_id, now, now, match_id)
+            )
+
+        if updates:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.executemany(
+                        "UPDATE parse_requests SET status = ?, job_id = ?, "
+                        "attempts = attempts + 1, poll_failures = 0, requested_at = ?, "
+                        "updated_at = ? WHERE match_id = ?",
+                        updates,
+                    )
+            logging.info(f"Sent {len(updates)} match parse requests.")
+
+        self.poll_jobs()
+        return len(updates)
+
+    def poll_jobs(self, delay=JOB_POLL_DELAY, limit=JOB_POLL_LIMIT):
+        """Checks parse jobs requested at least delay seconds ago, OpenDota forgets finished jobs.
+        A failed poll moves the job to the back of the line, after MAX_JOB_POLL_FAILURES it is FAILED."""
+        with self._lock:
+            jobs = (
+                self._connect()
+                .execute(
+                    "SELECT match_id, job_id FROM parse_requests "
+                    "WHERE status = ? AND requested_at <= ? ORDER BY requested_at LIMIT ?",
+                    (REQUESTED, time.time() - delay, limit),
+                )
+                .fetchall()
+            )
+
+        finished_match_ids = []
+        failed_match_ids = []
+        for match_id, job_id in jobs:
+            if job_id is None:
+                finished_match_ids.append(match_id)
+                continue
+            try:
+                response = CacheHandler.opendota_request_get(
+                    f"https://api.opendota.com/api/request/{job_id}"
+                )
+            except OpenDotaError as e:
+                logging.error(f"Could not poll parse job {job_id}, error: {e}.")
+                break
+            if not response.ok:
+                logging.error(
+                    f"Could not poll parse job {job_id}, status {response.status_code}."
+                )
+                failed_match_ids.append(match_id)
+                continue
+            try:
+                job = response.json()
+            except ValueError as e:
+                logging.error(
+                    f"Parse job {job_id} returned an invalid body, error: {e}."
+                )
+                failed_match_ids.append(match_id)
+                continue
+            if not job:
+                finished_match_ids.append(match_id)
+
+        if failed_match_ids:
+            now = time.time()
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.executemany(
+                        "UPDATE parse_requests SET poll_failures = poll_failures + 1, "
+                        "requested_at = ?, updated_at = ? WHERE match_id = ?",
+                        [(now, now, match_id) for match_id in failed_match_ids],
+                    )
+                    connection.execute(
+                        "UPDATE parse_requests SET status = ? "
+                        "WHERE status = ? AND poll_failures >= ?",
+                        (FAILED, REQUESTED, MAX_JOB_POLL_FAILURES),
+                    )
+
+        if finished_match_ids:
+            now = time.time()
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.executemany(
+                        "UPDATE parse_requests SET status = ?, updated_at = ? WHERE match_id = ?",
+                        [(DONE, now, match_id) for match_id in finished_match_ids],
+                    )
+            logging.debug(f"Parse jobs finished for matches {finished_match_ids}.")
+        return finished_match_ids
@@ -0,0 +1,210 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from vintage_stats.match_store import MatchStore
+from vintage_stats.reports import (
+    generate_last_week_report,
+    generate_winrate_report,
+    get_stacks_report_rows,
+)
+from vintage_stats.stacks import StackIndex
+from vintage_stats.utility import get_days_since_date
+
+
+class ReportConsumer:
+    """Settings of a report computed by the pipeline, finish(players_list) builds it
+    from the stored match lists once the pipeline fetched them.
+    Ranked consumers read the significant match lists, the same as OpenDota's default."""
+
+    streamed = False
+
+    def __init__(
+        self,
+        lobby_type=None,
+        _cutoff_date_from=None,
+        _cutoff_date_to=None,
+        significant=False,
+    ):
+        self.lobby_type = lobby_type
+        self.significant = significant
+        self.cutoff_date_from = _cutoff_date_from or datetime.now() - timedelta(days=7)
+        self.cutoff_date_to = _cutoff_date_to or datetime.now()
+        self.timestamp_from = self.cutoff_date_from.timestamp()
+        self.timestamp_to = self.cutoff_date_to.timestamp()
+
+    def get_days(self):
+        return get_days_since_date(self.cutoff_date_from)
+
+
+class StreamedReportConsumer(ReportConsumer):
+    """A report built from the shared pass over each player's matches.
+    Consumers only hold their settings, so they can be sent to worker processes.
+    Per player state comes from start_player, is filled by consume
+    and merged by finish(players_list, states)."""
+
+    streamed = True
+
+    def accepts(self, match):
+        return self.timestamp_from <= match.start_time <= self.timestamp_to and (
+            self.lobby_type is None or match.lobby_type == self.lobby_type
+        )
+
+
+class LastWeekReportConsumer(ReportConsumer):
+    """Same rows as generate_last_week_report, answered from the prefix sum range index"""
+
+    def __init__(self):
+        super().__init__(_cutoff_date_from=datetime.now() - timedelta(days=7))
+
+    def finish(self, players_list):
+        return generate_last_week_report(players_list)
+
+
+class WinrateReportConsumer(ReportConsumer):
+    """Same rows as generate_winrate_report, answered from the prefix sum range index"""
+
+    def __init__(
+        self, hero_count_threshold=3, _cutoff_date_from=None, _cutoff_date_to=None
+    ):
+        super().__init__(7, _cutoff_date_from, _cutoff_date_to, significant=True)
+        self.hero_count_threshold = hero_count_threshold
+
+    def finish(self, players_list):
+        return generate_winrate_report(
+            players_list,
+            self.hero_count_threshold,
+            self.cutoff_date_from,
+            self.cutoff_date_to,
+        )
+
+
+class StacksReportConsumer(StreamedReportConsumer):
+    """Collects the ranked results for a StackIndex, finish returns rows of every requested stack size,
+    same as get_all_stacks_report"""
+
+    def __init__(
+        self,
+        player_counts=(2, 3),
+        exclusive=False,
+        _cutoff_date_from=None,
+        _cutoff_date_to=None,
+    ):
+        super().__init__(
+            7,
+            _cutoff_date_from or datetime.now() - timedelta(days=28),
+            _cutoff_date_to,
+            significant=True,
+        )
+        self.player_counts = player_counts
+        self.exclusive = exclusive
+
+    def start_player(self):
+        return []
+
+    def consume(self, state, match):
+        state.append((match.match_id, match.won))
+
+    def finish(self, players_list, states):
+        stack_index = StackIndex(players_list, player_results=states)
+        return {
+            player_count: get_stacks_report_rows(
+                stack_index, players_list, player_count, self.exclusive
+            )
+            for player_count in self.player_counts
+        }
+
+
+def consume_matches(consumers, matches):
+    """One pass over a player's matches, newest first, feeding every consumer that accepts each one.
+    Module level so process pool workers can run it."""
+    states = [consumer.start_player() for consumer in consumers]
+    oldest_timestamp = min(consumer.timestamp_from for consumer in consumers)
+    for match in matches:
+        if match.start_time < oldest_timestamp:
+            break
+        for consumer, state in zip(consumers, states):
+            if consumer.accepts(match):
+                consumer.consume(state, match)
+    return states
+
+
+class ReportPipeline:
+    """Computes all registered reports from one fetch of each match list they need.
+    The widest window is fetched once. Streamed consumers of a list share one pass over it,
+    optionally with one worker process per player. The other consumers answer in finish
+    from the prefix sum range indexes, building an index is its own scan of the list."""
+
+    def __init__(self, players_list):
+        self.players_list = list(players_list)
+        self.consumers = []
+
+    def register(self, consumer):
+        self.consumers.append(consumer)
+        return consumer
+
+    def run(self, processes=0):
+        """Returns a dict of consumer to its report, processes=0 runs in this process"""
+        if not self.consumers or not self.players_list:
+            return {
+                consumer: self._finish(consumer, [], []) for consumer in self.consumers
+            }
+
+        days = max(consumer.get_days() for consumer in self.consumers)
+        MatchStore.request_window(days)
+        # Every needed list is fetched once, streamed consumers of the same list share one pass
+        consumer_groups = {}
+        for index, consumer in enumerate(self.consumers):
+            consumer_indexes = consumer_groups.setdefault(consumer.significant, [])
+            if consumer.streamed:
+                consumer_indexes.append(index)
+
+        player_states = [[None] * len(self.consumers) for _ in self.players_list]
+        for significant, consumer_indexes in consumer_groups.items():
+            MatchStore.prefetch(self.players_list, days, significant)
+            if not consumer_indexes:
+                continue
+            player_matches = [
+                MatchStore.load(player.player_id, days, significant)["matches"]
+                for player in self.players_list
+            ]
+            group_states = self._consume(
+                [self.consumers[index] for index in consumer_indexes],
+                player_matches,
+                processes,
+            )
+            for states, player_group_states in zip(player_states, group_states):
+                for index, state in zip(consumer_indexes, player_group_states):
+                    states[index] = state
+
+        # player_states is per player, each streamed consumer gets its column
+        return {
+            consumer: self._finish(
+                consumer,
+                self.players_list,
+                [states[index] for states in player_states],
+            )
+            for index, consumer in enumerate(self.consumers)
+        }
+
+    @staticmethod
+    def _finish(consumer, players_list, states):
+        if consumer.streamed:
+            return consumer.finish(players_list, states)
+        return consumer.finish(players_list)
+
+    def _consume(self, consumers, player_matches, processes):
+        if processes:
+            logging.debug(
+                f"Running {len(consumers)} reports for {len(player_matches)} players "
+                f"in {processes} processes."
+            )
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                return list(
+                    executor.map(
+                        consume_matches,
+                        [consumers] * len(player_matches),
+                        player_matches,
+                    )
+                )
+        return [consume_matches(consumers, matches) for matches in player_matches]
@@ -7,20 +7,43 @@ class PlayerClass:
     def __init__(self, pid, nick, match_id=None, mmr_amount=None):
         self.player_id = pid
         self.nick = nick
-        self.player_data = data_processing.get_file_cached_player_stats(self.player_id)
-        self.profile_nickname = self.player_data["profile"]["personaname"]
+        self._player_data = None
         self.known_mmr = {"match_id": match_id, "mmr_amount": mmr_amount}
+        # Match ID to the known MMR after it, every point anchors the MMR timeline
+        self.known_mmr_points = {}
+        if match_id is not None and mmr_amount is not None:
+            self.known_mmr_points[match_id] = mmr_amount
+
+    @property
+    def player_data(self):
+        """Profile data is loaded on first access, from the file cache or OpenDota"""
+        if self._player_data is None:
+            self._player_data = data_processing.get_file_cached_player_stats(
+                self.player_id
+            )
+        return self._player_data
+
+    @property
+    def profile_nickname(self):
+        return self.player_data["profile"]["personaname"]
 
     def __lt__(self, other):
         return self.profile_nickname < other.profile_nickname
 
     def __str__(self):
+        # Used in log messages, so it does not load the profile by itself
+        if self._player_data is None:
+            return "{} (ID: {})".format(self.nick, self.player_id)
         return "{} (Profile nickname: {}, ID: {})".format(
             self.nick, self.profile_nickname, self.player_id
         )
 
     def set_known_mmr_point(self, match_id, mmr_amount):
         self.known_mmr = {"match_id": match_id, "mmr_amount": mmr_amount}
+        self.add_known_mmr_point(match_id, mmr_amount)
+
+    def add_known_mmr_point(self, match_id, mmr_amount):
+        self.known_mmr_points[match_id] = mmr_amount
 
 
 class PlayerPool:
@@ -0,0 +1,118 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+
+from vintage_stats.utility import WLRecord
+
+
+class PrefixSeries:
+    """Start times in ascending order with a running count of wins, any time range is two bisects"""
+
+    __slots__ = ("start_times", "win_sums")
+
+    def __init__(self):
+        self.start_times = array("q")
+        # win_sums[i] is the number of wins among the first i matches
+        self.win_sums = array("q", [0])
+
+    def __len__(self):
+        return len(self.start_times)
+
+    def add(self, start_time, won):
+        if not self.start_times or start_time >= self.start_times[-1]:
+            self.start_times.append(start_time)
+            self.win_sums.append(self.win_sums[-1] + won)
+            return
+        # Older than the newest match, the sums after it shift by one
+        position = bisect_right(self.start_times, start_time)
+        self.start_times.insert(position, start_time)
+        self.win_sums.insert(position + 1, self.win_sums[position] + won)
+        for index in range(position + 2, len(self.win_sums)):
+            self.win_sums[index] += won
+
+    def get_bounds(self, timestamp_from=None, timestamp_to=None):
+        low = (
+            0
+            if timestamp_from is None
+            else bisect_left(self.start_times, timestamp_from)
+        )
+        high = (
+            len(self.start_times)
+            if timestamp_to is None
+            else bisect_right(self.start_times, timestamp_to)
+        )
+        return low, max(low, high)
+
+    def get_record(self, timestamp_from=None, timestamp_to=None):
+        low, high = self.get_bounds(timestamp_from, timestamp_to)
+        wins = self.win_sums[high] - self.win_sums[low]
+        return WLRecord(wins, high - low - wins)
+
+
+class MatchRangeIndex:
+    """Prefix sums over a player's matches for W-L of arbitrary date ranges without rescanning them.
+    Solo, party and every hero get their own series, new matches are added incrementally."""
+
+    def __init__(self, matches=()):
+        self.solo = PrefixSeries()
+        self.party = PrefixSeries()
+        self.heroes = {}
+        self.match_ids = set()
+        for match in sorted(matches, key=attrgetter("start_time")):
+            self.add(match)
+
+    def __len__(self):
+        return len(self.match_ids)
+
+    def add(self, match):
+        """Adds a Match record, returns False if the match is already indexed"""
+        if match.match_id in self.match_ids:
+            return False
+        self.match_ids.add(match.match_id)
+        series = self.party if match.is_party else self.solo
+        series.add(match.start_time, match.won)
+        hero_id = int(match.hero_id or 0)
+        hero_series = self.heroes.get(hero_id)
+        if hero_series is None:
+            hero_series = self.heroes[hero_id] = PrefixSeries()
+        hero_series.add(match.start_time, match.won)
+        return True
+
+    def get_solo_party_records(self, _cutoff_date_from=None, _cutoff_date_to=None):
+        timestamp_from, timestamp_to = get_timestamps(
+            _cutoff_date_from, _cutoff_date_to
+        )
+        return (
+            self.solo.get_record(timestamp_from, timestamp_to),
+            self.party.get_record(timestamp_from, timestamp_to),
+        )
+
+    def get_record(self, _cutoff_date_from=None, _cutoff_date_to=None):
+        solo_record, party_record = self.get_solo_party_records(
+            _cutoff_date_from, _cutoff_date_to
+        )
+        return solo_record + party_record
+
+    def get_hero_records(self, _cutoff_date_from=None, _cutoff_date_to=None):
+        """Hero ID to WLRecord, ordered by the most recent game on each hero, same as MatchTable"""
+        timestamp_from, timestamp_to = get_timestamps(
+            _cutoff_date_from, _cutoff_date_to
+        )
+        hero_ranges = []
+        for hero_id, series in self.heroes.items():
+            low, high = series.get_bounds(timestamp_from, timestamp_to)
+            if high > low:
+                wins = series.win_sums[high] - series.win_sums[low]
+                latest_start_time = series.start_times[high - 1]
+                hero_ranges.append(
+                    (latest_start_time, hero_id, WLRecord(wins, high - low - wins))
+                )
+        hero_ranges.sort(key=lambda hero_range: hero_range[0], reverse=True)
+        return {hero_id: record for _, hero_id, record in hero_ranges}
+
+
+def get_timestamps(_cutoff_date_from=None, _cutoff_date_to=None):
+    return (
+        _cutoff_date_from.timestamp() if _cutoff_date_from is not None else None,
+        _cutoff_date_to.timestamp() if _cutoff_date_to is not None else None,
+    )
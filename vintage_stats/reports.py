@@ -2,42 +2,19 @@ import itertools
 import logging
 from datetime import datetime, timedelta
 
-from vintage_stats.data_processing import CacheHandler, check_victory, get_stack_wl
+from vintage_stats.async_client import AsyncOpenDotaClient
+from vintage_stats.match_store import MatchStore
+from vintage_stats.stacks import StackIndex
 from vintage_stats.utility import WLRecord, get_days_since_date
 
 
 def generate_last_week_report(players_list):
+    MatchStore.prefetch(players_list, 7)
+    cutoff_date_from = datetime.now() - timedelta(days=7)
     all_reports_list = []
     for listed_player in players_list:
-        response_str = f"https://api.opendota.com/api/players/{listed_player.player_id}/matches?significant=0&date=7"
-        matches_response = CacheHandler.cached_opendota_request_get(response_str)
-
-        solo_wins = solo_losses = party_wins = party_losses = 0
-        for match in matches_response.json():
-            try:
-                player_won = check_victory(match)
-            except TypeError as err:
-                print(f"{err}, match_data: {match}")
-
-            if player_won:
-                if not match["party_size"]:
-                    solo_wins = solo_wins + 1
-                else:
-                    if int(match["party_size"]) > 1:
-                        party_wins = party_wins + 1
-                    else:
-                        solo_wins = solo_wins + 1
-            else:
-                if not match["party_size"]:
-                    solo_losses = solo_losses + 1
-                else:
-                    if int(match["party_size"]) > 1:
-                        party_losses = party_losses + 1
-                    else:
-                        solo_losses = solo_losses + 1
-
-        solo_record = WLRecord(solo_wins, solo_losses)
-        party_record = WLRecord(party_wins, party_losses)
+        range_index = MatchStore.get_range_index(listed_player.player_id, 7)
+        solo_record, party_record = range_index.get_solo_party_records(cutoff_date_from)
 
         player_record = {
             "nick": listed_player.nick,
@@ -70,83 +47,64 @@ def generate_winrate_report(
         "Detected date {}, days ago: {}".format(cutoff_date_from, days_since_cutoff)
     )
 
+    # Ranked reports count only significant matches, as OpenDota does by default
+    MatchStore.prefetch(players_list, days_since_cutoff, significant=True)
     all_reports_list = []
     for listed_player in players_list:
-        # print(listed_player)
-        response_str = "https://api.opendota.com/api/players/{}/matches?lobby_type=7&date={}".format(
-            listed_player.player_id, days_since_cutoff
+        # Ranges are answered from prefix sums, so any date range costs the same
+        range_index = MatchStore.get_range_index(
+            listed_player.player_id, days_since_cutoff, lobby_type=7, significant=True
+        )
+        solo_record, party_record = range_index.get_solo_party_records(
+            cutoff_date_from, cutoff_date_to
+        )
+        hero_pool = range_index.get_hero_records(cutoff_date_from, cutoff_date_to)
+
+        all_reports_list.append(
+            get_winrate_record(
+                listed_player.nick,
+                solo_record,
+                party_record,
+                hero_pool,
+                hero_count_threshold,
+            )
         )
 
-        matches_response = CacheHandler.cached_opendota_request_get(response_str)
-
-        solo_wins = solo_losses = party_wins = party_losses = 0
-        hero_pool = {}
-        for match in matches_response.json():
-            match_datetime = datetime.fromtimestamp(match["start_time"])
-
-            if match_datetime < cutoff_date_from or match_datetime > cutoff_date_to:
-                continue
-            # print(match['match_id'])
-            player_won = check_victory(match)
-            if match["hero_id"] not in hero_pool:
-                if player_won:
-                    hero_pool[match["hero_id"]] = WLRecord(1, 0)
-                else:
-                    hero_pool[match["hero_id"]] = WLRecord(0, 1)
-            else:
-                hero_pool[match["hero_id"]].add_match(player_won)
-
-            if player_won:
-                if not match["party_size"]:
-                    solo_wins = solo_wins + 1
-                else:
-                    if int(match["party_size"]) > 1:
-                        party_wins = party_wins + 1
-                    else:
-                        solo_wins = solo_wins + 1
-            else:
-                if not match["party_size"]:
-                    solo_losses = solo_losses + 1
-                else:
-                    if int(match["party_size"]) > 1:
-                        party_losses = party_losses + 1
-                    else:
-                        solo_losses = solo_losses + 1
-
-        solo_record = WLRecord(solo_wins, solo_losses)
-        party_record = WLRecord(party_wins, party_losses)
-
-        hero_count_once = 0
-        hero_count_more = 0
-        hero_more_total_record = WLRecord(0, 0)
-
-        hero_records_list = []
-        for hero in hero_pool:
-            hero_id_record_tuple = (hero, hero_pool[hero])
-            hero_records_list.append(hero_id_record_tuple)
-
-        hero_records_list.sort(key=lambda x: x[1].get_record_goodness(), reverse=True)
-
-        for hero in hero_pool:
-            if hero_pool[hero]:
-                hero_count_once = hero_count_once + 1
-            if hero_pool[hero].get_count() >= hero_count_threshold:
-                hero_count_more = hero_count_more + 1
-                hero_more_total_record += hero_pool[hero]
+    return all_reports_list
 
-        player_record = {
-            "nick": listed_player.nick,
-            "total": solo_record + party_record,
-            "solo": solo_record,
-            "party": party_record,
-            "hero_count": hero_count_once,
-            "hero_count_more": hero_count_more,
-            "hero_more_record": hero_more_total_record,
-            "best_heroes": hero_records_list,
-        }
-        all_reports_list.append(player_record)
 
-    return all_reports_list
+def get_winrate_record(
+    nick, solo_record, party_record, hero_pool, hero_count_threshold=3
+):
+    """Winrate report row of one player, hero_pool maps hero IDs to WLRecords"""
+    hero_count_once = 0
+    hero_count_more = 0
+    hero_more_total_record = WLRecord(0, 0)
+
+    hero_records_list = []
+    for hero in hero_pool:
+        hero_id_record_tuple = (hero, hero_pool[hero])
+        hero_records_list.append(hero_id_record_tuple)
+
+    hero_records_list.sort(key=lambda x: x[1].get_record_goodness(), reverse=True)
+
+    for hero in hero_pool:
+        if hero_pool[hero]:
+            hero_count_once = hero_count_once + 1
+        if hero_pool[hero].get_count() >= hero_count_threshold:
+            hero_count_more = hero_count_more + 1
+            hero_more_total_record += hero_pool[hero]
+
+    return {
+        "nick": nick,
+        "total": solo_record + party_record,
+        "solo": solo_record,
+        "party": party_record,
+        "hero_count": hero_count_once,
+        "hero_count_more": hero_count_more,
+        "hero_more_record": hero_more_total_record,
+        "best_heroes": hero_records_list,
+    }
 
 
 def get_all_stacks_report(
@@ -156,15 +114,22 @@ def get_all_stacks_report(
     _cutoff_date_from=None,
     _cutoff_date_to=None,
 ):
-    all_possible_stacks = itertools.combinations(
-        player_pool.get_player_list(), player_count
+    cutoff_date_from = _cutoff_date_from or datetime.now() - timedelta(days=28)
+    MatchStore.prefetch(
+        player_pool, get_days_since_date(cutoff_date_from), significant=True
     )
 
+    players_list = player_pool.get_player_list()
+    stack_index = StackIndex(players_list, _cutoff_date_from, _cutoff_date_to)
+    return get_stacks_report_rows(stack_index, players_list, player_count, exclusive)
+
+
+def get_stacks_report_rows(stack_index, players_list, player_count=2, exclusive=False):
+    all_possible_stacks = itertools.combinations(players_list, player_count)
+
     full_report = []
     for stack in all_possible_stacks:
-        stack_record = get_stack_wl(
-            stack, exclusive, player_pool, _cutoff_date_from, _cutoff_date_to
-        )
+        stack_record = stack_index.get_stack_record(stack, exclusive)
         sorted_stack_nicknames = sorted(player.nick for player in stack)
         stack_name = ""
         for index, nick in enumerate(sorted_stack_nicknames):
@@ -189,22 +154,67 @@ def get_player_activity_report(
 
     # We want to have at least 1 day for the API query
     days_since_cutoff = get_days_since_date(cutoff_date_from)
+    MatchStore.prefetch(players_list, days_since_cutoff, significant=True)
     for listed_player in players_list:
-        response_str = "https://api.opendota.com/api/players/{}/matches?lobby_type=7&date={}".format(
-            listed_player.player_id, days_since_cutoff
+        matches = MatchStore.get_matches(
+            listed_player.player_id,
+            days_since_cutoff,
+            lobby_type=7,
+            _cutoff_date_from=cutoff_date_from,
+            _cutoff_date_to=cutoff_date_to,
+            significant=True,
         )
-        matches_response = CacheHandler.cached_opendota_request_get(response_str)
 
         match_datetime_map = []
-        for match in matches_response.json():
-            match_datetime = datetime.fromtimestamp(match["start_time"])
-            if match_datetime < cutoff_date_from or match_datetime > cutoff_date_to:
-                continue
+        for match in matches:
             match_datetime_record = {
-                "match_id": match["match_id"],
-                "match_datetime": match_datetime,
+                "match_id": match.match_id,
+                "match_datetime": match.start_dt,
             }
             match_datetime_map.append(match_datetime_record)
         for match in match_datetime_map:
             print(f"{match['match_id']}\t{match['match_datetime']}")
         exit()
+
+
+async def generate_last_week_report_async(players_list, client=None):
+    client = client or AsyncOpenDotaClient()
+    await client.prefetch_matches(players_list, 7)
+    return generate_last_week_report(players_list)
+
+
+async def generate_winrate_report_async(
+    players_list,
+    hero_count_threshold=3,
+    _cutoff_date_from=None,
+    _cutoff_date_to=None,
+    client=None,
+):
+    client = client or AsyncOpenDotaClient()
+    cutoff_date_from = _cutoff_date_from or datetime.now() - timedelta(days=7)
+    await client.prefetch_matches(
+        players_list, get_days_since_date(cutoff_date_from), significant=True
+    )
+    return generate_winrate_report(
+        players_list, hero_count_threshold, _cutoff_date_from, _cutoff_date_to
+    )
+
+
+async def get_all_stacks_report_async(
+    player_pool,
+    player_count=2,
+    exclusive=False,
+    _cutoff_date_from=None,
+    _cutoff_date_to=None,
+    client=None,
+):
+    client = client or AsyncOpenDotaClient()
+    cutoff_date_from = _cutoff_date_from or datetime.now() - timedelta(days=28)
+    await client.prefetch_matches(
+        player_pool.get_player_list(),
+        get_days_since_date(cutoff_date_from),
+        significant=True,
+    )
+    return get_all_stacks_report(
+        player_pool, player_count, exclusive, _cutoff_date_from, _cutoff_date_to
+    )
@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import struct
+import zlib
+from pathlib import Path
+
+try:
+    import orjson
+
+    loads_json = orjson.loads
+
+    def dumps_json(value):
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+except ImportError:
+    loads_json = json.loads
+
+    def dumps_json(value):
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+# Every state file starts with the magic, the format version and the schema version of its content
+MAGIC = b"VSTS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">4sBH")
+STATE_SUFFIX = ".vsz"
+COMPRESSION_LEVEL = 6
+
+
+class SerializationError(Exception):
+    pass
+
+
+def dumps(value, schema_version):
+    """Compact JSON compressed with zlib, behind a header with the schema version"""
+    return HEADER.pack(MAGIC, FORMAT_VERSION, schema_version) + zlib.compress(
+        dumps_json(value), COMPRESSION_LEVEL
+    )
+
+
+def loads(content, schema_version):
+    """Raises SerializationError when the content is not in this format or has another schema version"""
+    if len(content) < HEADER.size:
+        raise SerializationError("State content is truncated.")
+    magic, format_version, content_schema_version = HEADER.unpack_from(content)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise SerializationError(f"Unknown state format {magic!r} {format_version}.")
+    if content_schema_version != schema_version:
+        raise SerializationError(
+            f"State schema version {content_schema_version}, expected {schema_version}."
+        )
+    try:
+        return loads_json(zlib.decompress(content[HEADER.size :]))
+    except (zlib.error, ValueError) as e:
+        raise SerializationError(f"State content is invalid: {e}") from e
+
+
+def save_state(path, value, schema_version):
+    """Writes the state atomically, a crash never leaves a half-written file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(path.name + ".tmp")
+    temporary_path.write_bytes(dumps(value, schema_version))
+    os.replace(temporary_path, path)
+
+
+def load_state(path, schema_version, legacy_path=None):
+    """Returns the stored state, None if it is missing, unreadable or of another schema version.
+    A plain JSON file at legacy_path is read instead when there is no state yet, then converted."""
+    path = Path(path)
+    if path.is_file():
+        try:
+            return loads(path.read_bytes(), schema_version)
+        except (OSError, SerializationError) as e:
+            logging.error(f"State file {path} ignored, error: {e}")
+            return None
+
+    if legacy_path is None or not Path(legacy_path).is_file():
+        return None
+    try:
+        value = loads_json(Path(legacy_path).read_bytes())
+    except (OSError, ValueError) as e:
+        logging.error(f"Legacy state file {legacy_path} ignored, error: {e}")
+        return None
+    save_state(path, value, schema_version)
+    os.remove(legacy_path)
+    logging.debug(f"Converted {legacy_path} to {path}.")
+    return value
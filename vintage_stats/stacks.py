@@ -0,0 +1,88 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import compress
+
+from vintage_stats.match_store import MatchStore
+from vintage_stats.utility import WLRecord, get_days_since_date
+
+
+class StackIndex:
+    """Match index over a pool of players, built in one pass over their ranked matches.
+    Every match is reduced to a bitmask of tracked players present and a bitmask of those who won,
+    so the record of any stack is a lookup over the few distinct masks instead of set intersections."""
+
+    def __init__(
+        self,
+        players_list,
+        _cutoff_date_from=None,
+        _cutoff_date_to=None,
+        player_results=None,
+    ):
+        """player_results can hold (match_id, won) pairs of every player's ranked matches in the range,
+        collected elsewhere, otherwise they are read from MatchStore"""
+        if player_results is None:
+            player_results = StackIndex.get_player_results(
+                players_list, _cutoff_date_from, _cutoff_date_to
+            )
+
+        self.player_bits = {}
+        presence_masks = {}
+        win_masks = {}
+        for index, (player, results) in enumerate(zip(players_list, player_results)):
+            player_bit = 1 << index
+            self.player_bits[player.player_id] = player_bit
+            for match_id, player_won in results:
+                presence_masks[match_id] = presence_masks.get(match_id, 0) | player_bit
+                if player_won:
+                    win_masks[match_id] = win_masks.get(match_id, 0) | player_bit
+
+        self.mask_counts = Counter(
+            (presence_mask, win_masks.get(match_id, 0))
+            for match_id, presence_mask in presence_masks.items()
+            if presence_mask & (presence_mask - 1)
+        )
+
+    @staticmethod
+    def get_player_results(players_list, _cutoff_date_from=None, _cutoff_date_to=None):
+        cutoff_date_from = _cutoff_date_from or datetime.now() - timedelta(days=28)
+        cutoff_date_to = _cutoff_date_to or datetime.now()
+        days_since_cutoff = get_days_since_date(cutoff_date_from)
+        player_results = []
+        for player in players_list:
+            matches_table = MatchStore.get_table(
+                player.player_id, days_since_cutoff, significant=True
+            )
+            mask = matches_table.get_mask(
+                lobby_type=7,
+                _cutoff_date_from=cutoff_date_from,
+                _cutoff_date_to=cutoff_date_to,
+            )
+            player_results.append(
+                zip(
+                    compress(matches_table.match_id, mask),
+                    compress(matches_table.won, mask),
+                )
+            )
+        return player_results
+
+    def get_stack_record(self, stack, exclusive=False):
+        """Exclusive records count only matches with no other tracked player present.
+        The result is taken from the last listed stack member, stacks are assumed to be on one team."""
+        if len(stack) <= 1:
+            return None
+        stack_mask = 0
+        for player in stack:
+            stack_mask |= self.player_bits[player.player_id]
+        result_bit = self.player_bits[stack[-1].player_id]
+
+        wins = losses = 0
+        for (presence_mask, win_mask), count in self.mask_counts.items():
+            if exclusive and presence_mask != stack_mask:
+                continue
+            if presence_mask & stack_mask != stack_mask:
+                continue
+            if win_mask & result_bit:
+                wins = wins + count
+            else:
+                losses = losses + count
+        return WLRecord(wins, losses)